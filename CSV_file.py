@@ -1,10 +1,96 @@
+import math
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
+import csv_cache
+
+PAGE_SIZES = [100, 500, 1000, 5000]
+NO_SORT = "(none)"
 
 st.title("📂 CSV File Viewer")
 
+# Content hash per upload; the Arrow cache is keyed by it
+@st.cache_data(max_entries=32, show_spinner=False)
+def file_hash(file_id, _file):
+    return csv_cache.content_hash(_file)
+
+@st.cache_data(max_entries=32)
+def load_summary(path):
+    return csv_cache.read_summary(path)
+
+# Unfiltered, unsorted views share memory with the mapped file, so they
+# cost next to nothing to keep and are shared by reruns and sessions
+@st.cache_resource(max_entries=8)
+def column_view(path, columns):
+    return csv_cache.query(path, columns)
+
+# Filtered or sorted results are copies as big as the rows they match;
+# each session keeps only its latest one, so paging doesn't rerun it
+def run_query(path, columns, filters, sort_by, descending):
+    if not filters and sort_by is None:
+        return column_view(path, columns)
+    key = (path, columns, filters, sort_by, descending)
+    last = st.session_state.get("last_query")
+    if last is None or last[0] != key:
+        st.session_state.last_query = None  # drop the old result before building the new one
+        st.session_state.last_query = (key, csv_cache.query(path, columns, filters, sort_by, descending))
+    return st.session_state.last_query[1]
+
 file = st.file_uploader("Upload CSV file", type="csv")
 
 if file:
-    df = pd.read_csv(file)
-    st.dataframe(df)
+    sha256 = file_hash(file.file_id, file)
+    try:
+        with st.spinner("Converting file..."):
+            path = csv_cache.convert_csv(file, sha256)
+    except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
+        st.error(f"Could not read {file.name}: {e}")
+        st.stop()
+
+    info = load_summary(path)
+    all_columns = info["columns"]
+    st.caption(f"{info['rows']:,} rows × {len(all_columns)} columns")
+    with st.expander("Column summary", expanded=True):
+        st.dataframe(info["summary"])
+
+    columns = st.multiselect("Columns", all_columns, default=all_columns)
+    col1, col2 = st.columns(2)
+    sort_by = col1.selectbox("Sort by", [NO_SORT] + all_columns)
+    descending = col2.checkbox("Descending")
+
+    st.write("Filters (all must match)")
+    edited = st.data_editor(
+        pd.DataFrame({"column": pd.Series(dtype="str"), "operator": pd.Series(dtype="str"),
+                      "value": pd.Series(dtype="str")}),
+        num_rows="dynamic",
+        column_config={
+            "column": st.column_config.SelectboxColumn("Column", options=all_columns),
+            "operator": st.column_config.SelectboxColumn("Operator", options=list(csv_cache.OPERATORS)),
+            "value": st.column_config.TextColumn("Value"),
+        },
+    )
+    filters = tuple(
+        (row["column"], row["operator"], row["value"])
+        for row in edited.to_dict("records")
+        if all(pd.notna(row[k]) and row[k] != "" for k in ("column", "operator", "value"))
+    )
+
+    try:
+        result = run_query(path, tuple(columns or all_columns), filters,
+                           None if sort_by == NO_SORT else sort_by, descending)
+    except (ValueError, pa.ArrowException) as e:
+        st.error(f"Invalid filter: {e}")
+        st.stop()
+
+    rows = result.num_rows
+    col1, col2 = st.columns(2)
+    page_size = col1.selectbox("Rows per page", PAGE_SIZES)
+    pages = max(1, math.ceil(rows / page_size))
+    page = col2.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1)
+
+    start = (page - 1) * page_size
+    view = result.slice(start, page_size).to_pandas()
+    view.index = pd.RangeIndex(start, start + len(view))
+    st.dataframe(view)
+    st.caption(f"Rows {min(start + 1, rows):,}–{min(start + page_size, rows):,} of {rows:,}"
+               + (f" (filtered from {info['rows']:,})" if filters else ""))
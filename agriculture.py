@@ -3,12 +3,40 @@ AI-Based Crop Disease Detection System
 Perfect for Nepal Agriculture Context
 """
 
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras import layers
 import numpy as np
 from PIL import Image
 import os
+import io
+import csv
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import importlib
+import argparse
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+# TensorFlow takes seconds and hundreds of MB to import, so it is only
+# loaded when a Keras model is built, trained, exported or loaded.
+# Callers that only need DISEASE_INFO/get_treatment() never pay for it.
+tf = keras = layers = None
+
+def import_tensorflow():
+    """Import TensorFlow on first use; returns the seconds it took (0 if already loaded)"""
+    global tf, keras, layers
+    if tf is not None:
+        return 0.0
+    started = time.perf_counter()
+    import tensorflow
+    tf, keras, layers = tensorflow, tensorflow.keras, tensorflow.keras.layers
+    return time.perf_counter() - started
 
 # Disease information database
 DISEASE_INFO = {
@@ -34,14 +62,166 @@ DISEASE_INFO = {
     }
 }
 
+def load_tflite_interpreter():
+    """TFLite Interpreter class from the lightest package installed"""
+    for module in ('tflite_runtime.interpreter', 'ai_edge_litert.interpreter'):
+        try:
+            return importlib.import_module(module).Interpreter
+        except ImportError:
+            pass
+    import_tensorflow()
+    return tf.lite.Interpreter
+
+
+class TFLiteModel:
+    """Runs an exported .tflite model; used in place of a Keras model"""
+    def __init__(self, path, num_threads=None):
+        Interpreter = load_tflite_interpreter()
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads or os.cpu_count())
+        self.batch_size = None
+    
+    def predict_on_batch(self, batch):
+        if len(batch) != self.batch_size:
+            # Resize the input once per distinct batch size
+            index = self.interpreter.get_input_details()[0]['index']
+            self.interpreter.resize_tensor_input(index, batch.shape)
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+            self.batch_size = len(batch)
+        
+        # int8 models take and return quantized tensors
+        if self.input['dtype'] != np.float32:
+            scale, zero_point = self.input['quantization']
+            info = np.iinfo(self.input['dtype'])
+            batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max)
+        self.interpreter.set_tensor(self.input['index'], batch.astype(self.input['dtype']))
+        self.interpreter.invoke()
+        predictions = self.interpreter.get_tensor(self.output['index'])
+        if self.output['dtype'] != np.float32:
+            scale, zero_point = self.output['quantization']
+            predictions = (predictions.astype(np.float32) - zero_point) * scale
+        return predictions
+
+
+class OnnxModel:
+    """Runs an exported .onnx model with onnxruntime; used in place of a Keras model"""
+    def __init__(self, path, num_threads=None):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+    
+    def predict_on_batch(self, batch):
+        return self.session.run(None, {self.input_name: batch.astype(np.float32)})[0]
+
+
+class ResultCache:
+    """LRU cache of predictions keyed by (model version, image hash), with an
+    optional SQLite file as a second tier that survives restarts. The file
+    keeps the max_db_entries most recently written results."""
+    def __init__(self, max_entries=1024, db_path=None, max_db_entries=100_000):
+        self.max_entries = max_entries
+        self.max_db_entries = max_db_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            with self.db:
+                self.db.execute("""
+                    CREATE TABLE IF NOT EXISTS results (
+                        model_version TEXT NOT NULL,
+                        image_hash TEXT NOT NULL,
+                        result TEXT NOT NULL,
+                        PRIMARY KEY (model_version, image_hash)
+                    )
+                """)
+    
+    def get(self, model_version, image_hash):
+        key = (model_version, image_hash)
+        with self.lock:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+            elif self.db is not None:
+                row = self.db.execute(
+                    "SELECT result FROM results WHERE model_version = ? AND image_hash = ?", key
+                ).fetchone()
+                if row:
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+        return copy_result(result) if result is not None else None
+    
+    def put(self, model_version, image_hash, result):
+        key = (model_version, image_hash)
+        with self.lock:
+            self._remember(key, copy_result(result))
+            if self.db is not None:
+                with self.db:
+                    cursor = self.db.execute(
+                        "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                        (model_version, image_hash, json.dumps(result))
+                    )
+                    # Rows get increasing rowids as they are written, so
+                    # everything this far behind the newest is the oldest
+                    self.db.execute(
+                        "DELETE FROM results WHERE rowid <= ?",
+                        (cursor.lastrowid - self.max_db_entries,)
+                    )
+    
+    def _remember(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def clear(self, keep_version=None):
+        """Drop the in-memory tier, and disk results of every model version
+        but keep_version"""
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                with self.db:
+                    self.db.execute("DELETE FROM results WHERE model_version IS NOT ?", (keep_version,))
+
+
+def copy_result(result):
+    return {**result, 'all_predictions': dict(result['all_predictions'])}
+
+
 class CropDiseaseDetector:
-    def __init__(self, img_size=150):
+    def __init__(self, img_size=150, cache_size=1024, cache_db=None):
         self.img_size = img_size
         self.model = None
+        self.model_version = None  # changes whenever the weights change
         self.class_names = ['healthy', 'bacterial_blight', 'leaf_spot', 'rust', 'powdery_mildew']
+        self.timings = {}  # startup steps -> seconds, see startup_timings()
+        # Repeat submissions of the same photo skip the model (cache_size=0 disables)
+        self.result_cache = ResultCache(cache_size, cache_db) if cache_size else None
+    
+    def set_model(self, model, version=None):
+        """Swap in new weights; cached results of the old ones are dropped"""
+        self.model = model
+        self.model_version = version or uuid.uuid4().hex
+        if self.result_cache is not None:
+            self.result_cache.clear(keep_version=self.model_version)
+    
+    def _import_tensorflow(self):
+        elapsed = import_tensorflow()
+        if elapsed:
+            self.timings['import_tensorflow'] = elapsed
+    
+    def startup_timings(self):
+        """Seconds spent importing TensorFlow, building/loading the model and warming up"""
+        return dict(self.timings)
         
     def build_model(self):
         """Build a simple CNN model for disease detection"""
+        self._import_tensorflow()
+        started = time.perf_counter()
         model = keras.Sequential([
             # Input layer
             layers.Input(shape=(self.img_size, self.img_size, 3)),
@@ -72,53 +252,249 @@ class CropDiseaseDetector:
             metrics=['accuracy']
         )
         
-        self.model = model
+        self.set_model(model)
+        self.timings['build_model'] = time.perf_counter() - started
         return model
     
-    def train_model(self, train_dir, epochs=10):
+    def build_augmentation(self):
+        """Random flips/rotations/zooms applied to training batches"""
+        self._import_tensorflow()
+        return keras.Sequential([
+            layers.RandomFlip('horizontal'),
+            layers.RandomRotation(0.1),
+            layers.RandomZoom(0.1),
+        ])
+    
+    def make_dataset(self, ds, cache_file=None, augment=False):
+        """Cache decoded images, augment in parallel and prefetch"""
+        self._import_tensorflow()
+        AUTOTUNE = tf.data.AUTOTUNE
+        # Decoded tensors are cached after the first epoch, on disk when a
+        # file is given, so later epochs skip JPEG decode entirely
+        ds = ds.cache(cache_file) if cache_file else ds.cache()
+        if augment:
+            augmentation = self.build_augmentation()
+            ds = ds.shuffle(100)
+            ds = ds.map(lambda x, y: (augmentation(x, training=True), y), num_parallel_calls=AUTOTUNE)
+        return ds.prefetch(AUTOTUNE)
+    
+    def cache_file(self, cache_dir, name, ds):
+        """Cache file path keyed by image size and the dataset's file list,
+        so adding or removing images never reuses a stale cache"""
+        if not cache_dir:
+            return None
+        os.makedirs(cache_dir, exist_ok=True)
+        fingerprint = hashlib.sha1('\n'.join(ds.file_paths).encode()).hexdigest()[:12]
+        return os.path.join(cache_dir, f'{name}_{self.img_size}_{fingerprint}')
+    
+    def train_model(self, train_dir, epochs=10, batch_size=32, validation_split=0.2,
+                    cache_dir='tf_cache', augment=True, patience=3,
+                    checkpoint_path='crop_disease_checkpoint.keras', seed=123):
         """Train the model on your dataset"""
-        # Load training data
-        train_ds = keras.preprocessing.image_dataset_from_directory(
-            train_dir,
+        self._import_tensorflow()
+        # Load training (and validation) data; class_names keeps the label
+        # order the same as self.class_names instead of alphabetical
+        options = dict(
             image_size=(self.img_size, self.img_size),
-            batch_size=32
+            batch_size=batch_size,
+            class_names=self.class_names,
+            seed=seed,
         )
+        if validation_split:
+            train_ds, val_ds = keras.utils.image_dataset_from_directory(
+                train_dir, validation_split=validation_split, subset='both', **options
+            )
+        else:
+            train_ds, val_ds = keras.utils.image_dataset_from_directory(train_dir, **options), None
+        
+        train_ds = self.make_dataset(train_ds, self.cache_file(cache_dir, 'train', train_ds), augment=augment)
+        if val_ds is not None:
+            val_ds = self.make_dataset(val_ds, self.cache_file(cache_dir, 'val', val_ds))
+        
+        # Stop when validation loss stops improving and keep the best weights
+        monitor = 'val_loss' if val_ds is not None else 'loss'
+        callbacks = [
+            keras.callbacks.EarlyStopping(monitor=monitor, patience=patience, restore_best_weights=True),
+        ]
+        if checkpoint_path:
+            callbacks.append(keras.callbacks.ModelCheckpoint(checkpoint_path, monitor=monitor, save_best_only=True))
         
         # Train
-        history = self.model.fit(train_ds, epochs=epochs)
+        history = self.model.fit(train_ds, validation_data=val_ds, epochs=epochs, callbacks=callbacks)
+        self.set_model(self.model)  # New weights, new cache version
         return history
     
     def preprocess_image(self, image_path):
         """Preprocess image for prediction"""
         img = Image.open(image_path)
+        img = img.convert('RGB')  # Grayscale, RGBA and palette images -> 3 channels
         img = img.resize((self.img_size, self.img_size))
         img_array = np.array(img)
         img_array = np.expand_dims(img_array, 0)  # Add batch dimension
         return img_array
     
-    def predict_disease(self, image_path):
-        """Predict disease from leaf image"""
+    def load_image_array(self, image):
+        """Image path, encoded bytes or array -> (img_size, img_size, 3) array"""
+        if isinstance(image, bytes):
+            image = io.BytesIO(image)
+        if isinstance(image, np.ndarray):
+            if image.ndim == 2:
+                image = image[..., None]
+            if image.shape[-1] == 1:
+                image = np.repeat(image, 3, axis=-1)
+            elif image.shape[-1] == 4:
+                image = image[..., :3]  # Drop alpha
+            if image.shape[:2] != (self.img_size, self.img_size):
+                image = np.array(Image.fromarray(image).resize((self.img_size, self.img_size)))
+            return image
+        return self.preprocess_image(image)[0]
+    
+    @staticmethod
+    def list_images(directory):
+        """Image files in a directory (recursively), in a stable order"""
+        paths = []
+        for root, _, files in os.walk(directory):
+            paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+        return sorted(paths)
+    
+    def iter_decoded(self, images, workers=None, prefetch=64, load=None):
+        """Decode and resize images on a thread pool, in order, keeping `prefetch`
+        in flight so the next ones are ready while the model runs. An image
+        that can't be read is yielded as the exception instead. `load(image)`
+        replaces the decode step if given."""
+        if isinstance(images, str) and os.path.isdir(images):
+            images = self.list_images(images)
+        workers = workers or min(8, os.cpu_count() or 1)
+        load = load or (lambda image: _decode(self, image))
+        images = iter(images)
+        pending = deque()
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            def fill():
+                for image in images:
+                    pending.append(pool.submit(load, image))
+                    if len(pending) >= prefetch:
+                        return
+            
+            fill()
+            while pending:
+                decoded = pending.popleft().result()
+                fill()  # Workers decode ahead while the caller uses this one
+                yield decoded
+    
+    def iter_batches(self, images, batch_size=32, workers=None, prefetch=2):
+        """Decoded images in batches, keeping `prefetch` batches in flight;
+        unreadable images are skipped"""
+        batch = []
+        for image in self.iter_decoded(images, workers, batch_size * (prefetch + 1)):
+            if isinstance(image, Exception):
+                continue
+            batch.append(image)
+            if len(batch) == batch_size:
+                yield np.stack(batch).astype(np.float32)
+                batch = []
+        if batch:
+            yield np.stack(batch).astype(np.float32)
+    
+    @staticmethod
+    def image_hash(image):
+        """SHA-256 of an image's bytes (file contents, encoded bytes or array data)"""
+        sha256 = hashlib.sha256()
+        if isinstance(image, np.ndarray):
+            sha256.update(f"{image.shape}{image.dtype}".encode())
+            sha256.update(np.ascontiguousarray(image).tobytes())
+        elif isinstance(image, bytes):
+            sha256.update(image)
+        else:
+            with open(image, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha256.update(chunk)
+        return sha256.hexdigest()
+    
+    def lookup_or_decode(self, image, model_version):
+        """(hash, cached result, None) for an image seen before with this model,
+        else (hash, None, decoded array or the exception). A file is read once
+        for both hashing and decoding."""
+        try:
+            if isinstance(image, (str, os.PathLike)):
+                with open(image, 'rb') as f:
+                    image = f.read()
+            image_hash = self.image_hash(image)
+        except OSError as e:
+            return None, None, e
+        result = self.result_cache.get(model_version, image_hash)
+        if result is not None:
+            return image_hash, result, None
+        return image_hash, None, _decode(self, image)
+    
+    def predict_batch(self, images, batch_size=32, workers=None):
+        """Predict diseases for many images (paths, bytes, arrays or a directory),
+        one forward pass per batch. Images seen before with the same model
+        come from the result cache; an unreadable image gets {'error': ...}
+        in its place."""
         if self.model is None:
             raise Exception("Model not built or loaded. Call build_model() first.")
+        if isinstance(images, str) and os.path.isdir(images):
+            images = self.list_images(images)
+        images = list(images)
         
-        # Preprocess image
-        img_array = self.preprocess_image(image_path)
-        
-        # Make prediction
-        predictions = self.model.predict(img_array)
-        predicted_class = np.argmax(predictions[0])
-        confidence = predictions[0][predicted_class]
+        results = [None] * len(images)
+        hashes = [None] * len(images)
+        model_version = self.model_version
+        batch, positions = [], []
+        def run():
+            # One forward pass for the whole batch
+            predictions = np.asarray(self.model.predict_on_batch(np.stack(batch).astype(np.float32)))
+            for i, result in zip(positions, self.decode_predictions(predictions)):
+                results[i] = result
+                if self.result_cache is not None:
+                    self.result_cache.put(model_version, hashes[i], result)
+            batch.clear()
+            positions.clear()
         
-        disease_name = self.class_names[predicted_class]
-        
-        return {
-            'disease': disease_name,
-            'confidence': float(confidence),
-            'all_predictions': {
-                self.class_names[i]: float(predictions[0][i]) 
-                for i in range(len(self.class_names))
+        # Hashing and the cache lookup run on the decode workers too, so a
+        # cached image is never decoded and a file is only read once
+        load = None
+        if self.result_cache is not None:
+            load = lambda image: self.lookup_or_decode(image, model_version)
+        decoded = self.iter_decoded(images, workers, prefetch=batch_size * 3, load=load)
+        for i, item in enumerate(decoded):
+            image = item
+            if self.result_cache is not None:
+                hashes[i], results[i], image = item
+                if results[i] is not None:
+                    continue
+            if isinstance(image, Exception):
+                # Only this image fails; errors are not cached
+                results[i] = {'error': f"Could not read image: {image}"}
+                continue
+            batch.append(image)
+            positions.append(i)
+            if len(batch) == batch_size:
+                run()
+        if batch:
+            run()
+        return results
+    
+    def decode_predictions(self, predictions):
+        """Turn a (batch, classes) probability array into result dicts"""
+        predicted = predictions.argmax(axis=1)
+        confidences = predictions[np.arange(len(predictions)), predicted]
+        return [
+            {
+                'disease': self.class_names[index],
+                'confidence': float(confidence),
+                'all_predictions': dict(zip(self.class_names, row))
             }
-        }
+            for index, confidence, row in zip(predicted.tolist(), confidences.tolist(), predictions.tolist())
+        ]
+    
+    def predict_disease(self, image_path):
+        """Predict disease from leaf image"""
+        result = self.predict_batch([image_path], batch_size=1, workers=1)[0]
+        if 'error' in result:
+            raise ValueError(result['error'])
+        return result
     
     def get_treatment(self, disease_name):
         """Get treatment recommendation"""
@@ -127,9 +503,10 @@ class CropDiseaseDetector:
             'prevention': 'Follow good farming practices.'
         })
     
-    def diagnose(self, image_path):
-        """Complete diagnosis with treatment"""
-        result = self.predict_disease(image_path)
+    def add_treatment(self, result):
+        """Add treatment and prevention advice to a prediction"""
+        if 'error' in result:
+            return result
         treatment = self.get_treatment(result['disease'])
         
         return {
@@ -138,15 +515,216 @@ class CropDiseaseDetector:
             'prevention': treatment['prevention']
         }
     
+    def diagnose(self, image_path):
+        """Complete diagnosis with treatment"""
+        return self.add_treatment(self.predict_disease(image_path))
+    
+    def diagnose_batch(self, images, batch_size=32, workers=None):
+        """Complete diagnosis with treatment for many images; unreadable
+        images get {'error': ...} in their place"""
+        return [self.add_treatment(result) for result in self.predict_batch(images, batch_size, workers)]
+    
     def save_model(self, path='crop_disease_model.h5'):
         """Save trained model"""
         self.model.save(path)
         print(f"Model saved to {path}")
     
-    def load_model(self, path='crop_disease_model.h5'):
-        """Load pretrained model"""
-        self.model = keras.models.load_model(path)
+    def export_tflite(self, path='crop_disease_model.tflite', quantization='float16',
+                      representative_images=None, num_samples=100):
+        """Export to TFLite with post-training quantization.
+        quantization: None (float32), 'float16' (half-size weights) or 'int8'
+        (full integer, calibrated on `representative_images`: paths or a directory)"""
+        self._import_tensorflow()
+        converter = tf.lite.TFLiteConverter.from_keras_model(self.model)
+        
+        if quantization == 'float16':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif quantization == 'int8':
+            if representative_images is None:
+                raise ValueError("int8 quantization needs representative_images for calibration")
+            
+            def representative_dataset():
+                for i, batch in enumerate(self.iter_batches(representative_images, batch_size=1)):
+                    if i >= num_samples:
+                        return
+                    yield [batch]
+            
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.uint8
+            converter.inference_output_type = tf.uint8
+        elif quantization is not None:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        
+        with open(path, 'wb') as f:
+            f.write(converter.convert())
+        print(f"TFLite model ({quantization or 'float32'}) saved to {path}")
+    
+    def export_onnx(self, path='crop_disease_model.onnx'):
+        """Export to ONNX (needs the tf2onnx package)"""
+        self._import_tensorflow()
+        import tf2onnx
+        spec = (tf.TensorSpec((None, self.img_size, self.img_size, 3), tf.float32, name='image'),)
+        tf2onnx.convert.from_keras(self.model, input_signature=spec, output_path=path)
+        print(f"ONNX model saved to {path}")
+    
+    def load_model(self, path='crop_disease_model.h5', num_threads=None):
+        """Load pretrained model; .tflite and .onnx files run on the lightweight
+        tflite_runtime/onnxruntime backends instead of Keras.
+        num_threads caps the threads one forward pass uses (default: all cores)"""
+        started = time.perf_counter()
+        if path.endswith('.tflite'):
+            model = TFLiteModel(path, num_threads)
+        elif path.endswith('.onnx'):
+            model = OnnxModel(path, num_threads)
+        else:
+            self._import_tensorflow()
+            if num_threads:
+                try:
+                    tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+                    tf.config.threading.set_inter_op_parallelism_threads(num_threads)
+                except RuntimeError:
+                    pass  # TensorFlow already initialized in this process
+            started = time.perf_counter()
+            model = keras.models.load_model(path)
+        # The file's hash is the model version, so the disk cache stays valid
+        # across restarts with the same weights
+        self.set_model(model, self.image_hash(path))
+        self.timings['load_model'] = time.perf_counter() - started
         print(f"Model loaded from {path}")
+    
+    def warmup(self, batch_sizes=(1,)):
+        """Run dummy batches so graph tracing / tensor allocation happens now
+        instead of on the first real prediction"""
+        if self.model is None:
+            raise Exception("Model not built or loaded. Call build_model() first.")
+        started = time.perf_counter()
+        for batch_size in batch_sizes:
+            batch = np.zeros((batch_size, self.img_size, self.img_size, 3), dtype=np.float32)
+            self.model.predict_on_batch(batch)
+        self.timings['warmup'] = time.perf_counter() - started
+        return self.timings['warmup']
+
+
+# Directory scans on a process pool: the parent decodes images on threads
+# into shared-memory batches, worker processes (each holding its own copy of
+# the model) run the forward passes, and results are written as they finish.
+_worker_detector = None
+
+def _init_worker(model_path, img_size, num_threads):
+    """Load the model once per worker process"""
+    global _worker_detector
+    _worker_detector = CropDiseaseDetector(img_size, cache_size=0)
+    _worker_detector.load_model(model_path, num_threads=num_threads)
+
+
+def _diagnose_shared(block_name, count, shape):
+    """Diagnose `count` images already decoded into a shared-memory block"""
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        batch = np.ndarray((count, *shape), dtype=np.float32, buffer=block.buf)
+        predictions = np.asarray(_worker_detector.model.predict_on_batch(batch))
+        del batch  # release the view before closing the block
+        return [_worker_detector.add_treatment(r) for r in _worker_detector.decode_predictions(predictions)]
+    finally:
+        block.close()
+
+
+def _decode(detector, path):
+    try:
+        return detector.load_image_array(path)
+    except Exception as e:
+        return e
+
+
+def result_writer(f, output_path, class_names):
+    """write(image_path, result) for a .csv or .jsonl output file; CSV rows
+    get one probability column per class, failed images an error column"""
+    if output_path.endswith('.csv'):
+        fields = ['image', 'disease', 'confidence', 'treatment', 'prevention', *class_names, 'error']
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        
+        def write(path, result):
+            writer.writerow({'image': path, **result, **result.get('all_predictions', {})})
+    else:
+        def write(path, result):
+            f.write(json.dumps({'image': path, **result}) + '\n')
+    return write
+
+
+def diagnose_directory(directory, model_path, output_path='diagnoses.jsonl', processes=None,
+                       batch_size=32, img_size=150, decode_workers=None):
+    """Diagnose every image under `directory` with `processes` worker processes
+    and stream the results to a .csv or .jsonl file in completion order.
+    Returns the number of images written."""
+    processes = processes or os.cpu_count() or 1
+    num_threads = max(1, (os.cpu_count() or 1) // processes)
+    decoder = CropDiseaseDetector(img_size, cache_size=0)
+    paths = decoder.list_images(directory)
+    shape = (img_size, img_size, 3)
+    
+    # Two blocks per worker: one being run while the next is filled
+    blocks = [shared_memory.SharedMemory(create=True, size=batch_size * int(np.prod(shape)) * 4)
+              for _ in range(processes * 2)]
+    free = list(blocks)
+    pending = {}  # future -> (block, image paths in it)
+    written = 0
+    
+    # spawn: workers must not inherit a parent that may have TensorFlow loaded
+    pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_worker, initargs=(model_path, img_size, num_threads))
+    try:
+        with open(output_path, 'w', newline='', encoding='utf-8') as f, \
+                ThreadPoolExecutor(decode_workers or min(8, os.cpu_count() or 1)) as decode_pool:
+            write = result_writer(f, output_path, decoder.class_names)
+            
+            def collect(return_when):
+                nonlocal written
+                done, _ = wait(pending, return_when=return_when)
+                for future in done:
+                    block, batch_paths = pending.pop(future)
+                    free.append(block)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        results = [{'error': str(e)}] * len(batch_paths)
+                    for path, result in zip(batch_paths, results):
+                        write(path, result)
+                    written += len(batch_paths)
+                f.flush()
+            
+            chunks = (paths[i:i + batch_size] for i in range(0, len(paths), batch_size))
+            for chunk in chunks:
+                # Decode this chunk while the workers run the earlier ones
+                images = list(decode_pool.map(lambda path: _decode(decoder, path), chunk))
+                while not free:
+                    collect(FIRST_COMPLETED)
+                block = free.pop()
+                decoded = np.ndarray((batch_size, *shape), dtype=np.float32, buffer=block.buf)
+                batch_paths = []
+                for path, image in zip(chunk, images):
+                    if isinstance(image, Exception):
+                        write(path, {'error': f"Could not read image: {image}"})
+                        written += 1
+                    else:
+                        decoded[len(batch_paths)] = image
+                        batch_paths.append(path)
+                del decoded  # no views may outlive the block
+                if batch_paths:
+                    pending[pool.submit(_diagnose_shared, block.name, len(batch_paths), shape)] = (block, batch_paths)
+                else:
+                    free.append(block)
+            while pending:
+                collect(FIRST_COMPLETED)
+    finally:
+        pool.shutdown(cancel_futures=True)
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return written
 
 
 # Example Usage
@@ -191,8 +769,28 @@ def main():
     # print(f"🛡️ Prevention: {result['prevention']}")
 
 
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Crop disease detection. With no arguments, prints the usage guide.")
+    parser.add_argument('directory', nargs='?', help="diagnose every image under this folder")
+    parser.add_argument('--model', default='crop_disease_model.h5', help=".h5/.keras, .tflite or .onnx model")
+    parser.add_argument('--output', default='diagnoses.jsonl', help="results file, .csv or .jsonl")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--img-size', type=int, default=150)
+    args = parser.parse_args(argv)
+    
+    if args.directory is None:
+        main()
+        return
+    started = time.perf_counter()
+    count = diagnose_directory(args.directory, args.model, args.output, args.processes,
+                               args.batch_size, args.img_size)
+    elapsed = time.perf_counter() - started
+    print(f"Diagnosed {count} images in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.1f} images/s) -> {args.output}")
+
+
 if __name__ == "__main__":
-    main()
+    cli()
 
 
 # Quick Start Guide for Nepali Farmers:
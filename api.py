@@ -1,38 +1,219 @@
 from flask import Flask, request, jsonify
 import sqlite3
+import json
+import queue
+import threading
+import atexit
+import time
 from datetime import datetime
+from storage import (
+    connection, init_db, update_rollups, window_query, query_since, now_ms, DEFAULT_DEVICE
+)
+from pythonapistreamlit.downsample import lttb_rows
 
 app = Flask(__name__)
 
-def init_db():
-    conn = sqlite3.connect("iot.db")
-    cur = conn.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            temperature REAL,
-            humidity REAL,
-            time TEXT
+DEFAULT_WINDOW_MS = 24 * 60 * 60 * 1000   # GET /data covers the last day by default
+DEFAULT_MAX_POINTS = 500
+SINCE_LIMIT = 5000      # most rows returned by one since_id request
+
+# Write-behind queue settings
+BATCH_SIZE = 500        # commit after this many rows
+FLUSH_MS = 200          # or after this many milliseconds
+QUEUE_SIZE = 10000      # max readings waiting to be written
+RETRY_MIN_S = 0.1       # first wait after a failed write, doubled on each retry
+RETRY_MAX_S = 5.0
+
+write_queue = queue.Queue(maxsize=QUEUE_SIZE)
+stop_event = threading.Event()
+enqueue_lock = threading.Lock()
+
+# Turn one JSON reading into a row for the data table
+def to_row(d):
+    if not isinstance(d, dict):
+        raise TypeError("each reading must be a JSON object")
+    now = datetime.now()
+    return (
+        str(d.get("device_id", DEFAULT_DEVICE)),
+        float(d["temperature"]),
+        float(d["humidity"]),
+        str(now),
+        int(now.timestamp() * 1000),
+    )
+
+# Write many readings with one executemany in one transaction
+def insert_readings(rows):
+    with connection() as conn, conn:
+        conn.executemany(
+            "INSERT INTO data (device_id, temperature, humidity, time, ts) VALUES (?, ?, ?, ?, ?)",
+            rows
         )
-    """)
-    conn.commit()
-    conn.close()
+        update_rollups(conn)
+    return len(rows)
+
+# Writer thread: drain the queue and group-commit into the data table
+def writer_loop():
+    while not (stop_event.is_set() and write_queue.empty()):
+        try:
+            rows = [write_queue.get(timeout=FLUSH_MS / 1000)]
+        except queue.Empty:
+            continue
+
+        deadline = time.monotonic() + FLUSH_MS / 1000
+        while len(rows) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(write_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        write_batch(rows)
+
+# Clients were already told ok, so a failed write (e.g. database locked past
+# the busy timeout) is retried with backoff rather than dropped. Meanwhile
+# the queue fills up and new requests get 503 until writes succeed again.
+# Once shutting down, a batch gets one last attempt.
+def write_batch(rows):
+    delay = RETRY_MIN_S
+    while True:
+        try:
+            insert_readings(rows)
+            return
+        except sqlite3.Error as e:
+            if stop_event.is_set():
+                print(f"Dropped {len(rows)} reading(s) on shutdown: {e}")
+                return
+            print(f"Failed to write {len(rows)} reading(s), retrying in {delay:.1f}s: {e}")
+            stop_event.wait(delay)
+            delay = min(delay * 2, RETRY_MAX_S)
+
+writer_thread = threading.Thread(target=writer_loop, name="iot-writer", daemon=True)
+
+def start_writer():
+    if not writer_thread.is_alive() and not stop_event.is_set():
+        writer_thread.start()
+
+# Flush whatever is still queued before the process exits
+def stop_writer():
+    stop_event.set()
+    if writer_thread.is_alive():
+        writer_thread.join()
+
+atexit.register(stop_writer)
+
+# Put rows on the queue without blocking; False means the queue is full.
+# A batch is queued all-or-nothing so the client can simply retry it.
+def enqueue(rows):
+    with enqueue_lock:
+        start_writer()
+        if write_queue.qsize() + len(rows) > QUEUE_SIZE:
+            return False
+        for row in rows:
+            write_queue.put_nowait(row)
+    return True
+
+def queue_full_response():
+    response = jsonify({"status": "busy", "queued": write_queue.qsize()})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+# Read a batch body: a JSON array, {"readings": [...]}, a single reading
+# object, or NDJSON (one reading per line)
+def parse_batch():
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        text = request.get_data(as_text=True)
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    d = request.get_json()
+    if isinstance(d, dict):
+        d = d["readings"] if "readings" in d else [d]
+    if not isinstance(d, list):
+        raise TypeError("expected a JSON array of readings")
+    return d
 
 @app.route("/data", methods=["POST"])
 def receive_data():
-    d = request.get_json()
+    try:
+        row = to_row(request.get_json())
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"status": "error", "message": f"Bad reading: {e}"}), 400
 
-    conn = sqlite3.connect("iot.db")
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO data VALUES (NULL, ?, ?, ?)",
-        (d["temperature"], d["humidity"], datetime.now())
-    )
-    conn.commit()
-    conn.close()
+    if not enqueue([row]):
+        return queue_full_response()
 
     return jsonify({"status": "ok"})
 
+@app.route("/data/batch", methods=["POST"])
+def receive_batch():
+    try:
+        readings = parse_batch()
+        rows = [to_row(d) for d in readings]
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({"status": "error", "message": f"Bad reading: {e}"}), 400
+
+    if not enqueue(rows):
+        return queue_full_response()
+
+    return jsonify({"status": "ok", "count": len(rows)})
+
+# Raw readings newer than since_id, for clients that keep their own copy.
+# last_id is the cursor for the next request; more is true if rows were cut off.
+def get_data_since(since_id, device_id):
+    rows = query_since(since_id, device_id, SINCE_LIMIT)
+    points = [
+        {"id": r[0], "ts": r[1], "temperature": r[2], "humidity": r[3]}
+        for r in rows
+    ]
+    last_id = points[-1]["id"] if points else since_id
+
+    return jsonify({
+        "source": "data",
+        "count": len(points),
+        "last_id": last_id,
+        "more": len(points) == SINCE_LIMIT,
+        "data": points,
+    })
+
+# Readings between from/to (epoch ms), LTTB-downsampled to max_points.
+# Long windows are read from the rollup tables, so the query stays bounded too.
+# With since_id, only raw readings newer than that id are returned instead.
+@app.route("/data", methods=["GET"])
+def get_data():
+    device_id = request.args.get("device_id", DEFAULT_DEVICE)
+    if "since_id" in request.args:
+        try:
+            since_id = int(request.args["since_id"])
+        except ValueError:
+            return jsonify({"status": "error", "message": "since_id must be an integer"}), 400
+        return get_data_since(since_id, device_id)
+
+    try:
+        end = int(request.args.get("to", now_ms()))
+        start = int(request.args.get("from", end - DEFAULT_WINDOW_MS))
+        max_points = int(request.args.get("max_points", DEFAULT_MAX_POINTS))
+    except ValueError:
+        return jsonify({"status": "error", "message": "from, to and max_points must be integers"}), 400
+    if max_points < 3:
+        return jsonify({"status": "error", "message": "max_points must be at least 3"}), 400
+
+    source, sql, params = window_query(start, end, device_id, max_points)
+    with connection() as conn:
+        cur = conn.execute(sql, params)
+        columns = [c[0] for c in cur.description]
+        rows = [
+            {"ts": r["ts"], "temperature": r["temperature_mean"], "humidity": r["humidity_mean"]}
+            for r in (dict(zip(columns, row)) for row in cur)
+        ]
+    points = lttb_rows(rows, "ts", ["temperature", "humidity"], max_points)
+
+    return jsonify({"source": source, "count": len(points), "data": points})
+
+@app.route("/queue", methods=["GET"])
+def queue_status():
+    return jsonify({"queued": write_queue.qsize(), "capacity": QUEUE_SIZE})
+
 if __name__ == "__main__":
     init_db()
     app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import shutil
+import uuid
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB per read/write
+
+ATTACHMENTS_FOLDER = "project_attachments"
+# Content-addressed store: every file is kept once, at blobs/<2 hex>/<sha256>
+BLOBS_FOLDER = os.path.join(ATTACHMENTS_FOLDER, "blobs")
+TMP_FOLDER = os.path.join(BLOBS_FOLDER, "tmp")
+
+# Copy an uploaded file (any file-like object) to dest_path in chunks,
+# hashing as it goes. Writes to a .part file first so a failed upload
+# never leaves a half-written attachment behind.
+def save_upload(uploaded_file, dest_path, chunk_size=CHUNK_SIZE):
+    sha256 = hashlib.sha256()
+    size = 0
+    part_path = dest_path + ".part"
+
+    uploaded_file.seek(0)
+    try:
+        with open(part_path, "wb") as f:
+            while True:
+                chunk = uploaded_file.read(chunk_size)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(part_path, dest_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    return {"size": size, "sha256": sha256.hexdigest()}
+
+def blob_path(sha256):
+    return os.path.join(BLOBS_FOLDER, sha256[:2], sha256)
+
+# Move a finished temp file into the blob store; if the same content is
+# already stored, the temp file is simply dropped
+def _commit_blob(tmp_path, sha256):
+    path = blob_path(sha256)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return path
+
+# Stream an upload to a temp file and return its size, hash and tmp_path.
+# The blob is only committed by commit_uploads, inside the transaction that
+# adds the attachment rows referencing it, so delete_project (which removes
+# unreferenced blobs in its own transaction) can never delete it under us.
+def stage_upload(uploaded_file):
+    os.makedirs(TMP_FOLDER, exist_ok=True)
+    tmp_path = os.path.join(TMP_FOLDER, uuid.uuid4().hex)
+    saved = save_upload(uploaded_file, tmp_path)
+    saved["tmp_path"] = tmp_path
+    return saved
+
+# Move staged uploads into the blob store; call with the write lock held
+def commit_uploads(attachments):
+    for attachment in attachments:
+        tmp_path = attachment.pop("tmp_path", None)
+        if tmp_path:
+            _commit_blob(tmp_path, attachment["sha256"])
+
+# Remove staged uploads that were never committed
+def discard_uploads(attachments):
+    for attachment in attachments:
+        tmp_path = attachment.pop("tmp_path", None)
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# Copy a file already on disk into the blob store (used when migrating,
+# before anything can delete blobs)
+def store_file(path):
+    with open(path, "rb") as f:
+        saved = stage_upload(f)
+    commit_uploads([saved])
+    return saved
+
+# Remove blobs that no attachment references any more
+def delete_blobs(hashes):
+    for sha256 in hashes:
+        path = blob_path(sha256)
+        if os.path.exists(path):
+            os.remove(path)
+
+# Remove a legacy project_attachments/<project_id> folder
+def delete_project_folder(project_id):
+    folder = os.path.join(ATTACHMENTS_FOLDER, project_id)
+    if os.path.isdir(folder):
+        shutil.rmtree(folder)
+
+# Callable for st.download_button: the file is only read when clicked
+def file_loader(path):
+    def load():
+        with open(path, "rb") as f:
+            return f.read()
+    return load
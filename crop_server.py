@@ -0,0 +1,139 @@
+"""
+Crop Disease Detection HTTP service
+Concurrent requests are grouped into micro-batches for one shared model
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import numpy as np
+from fastapi import FastAPI, File, HTTPException, UploadFile
+
+from agriculture import CropDiseaseDetector
+
+MODEL_PATH = os.environ.get("CROP_MODEL_PATH", "crop_disease_model.h5")
+MAX_BATCH_SIZE = int(os.environ.get("CROP_MAX_BATCH_SIZE", 32))
+MAX_WAIT_MS = float(os.environ.get("CROP_MAX_WAIT_MS", 10))   # how long a batch waits to fill up
+MAX_QUEUE = 1000                                               # requests waiting for the model
+
+
+class MicroBatcher:
+    """Collects queued requests into batches of up to max_batch_size, waiting
+    at most max_wait_ms after the first one, and runs each batch as one
+    diagnose_batch() call off the event loop"""
+    def __init__(self, detector, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue(maxsize=MAX_QUEUE)
+        self.latencies = deque(maxlen=1000)   # recent request latencies (ms)
+        self.batch_sizes = deque(maxlen=1000)
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    async def submit(self, image_bytes):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((image_bytes, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=503, detail="Server busy, try again")
+        return await future
+
+    async def next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        while True:
+            batch = await self.next_batch()
+            images = [image for image, _, _ in batch]
+            started = time.perf_counter()
+            try:
+                results = await asyncio.to_thread(self.detector.diagnose_batch, images, batch_size=len(images))
+            except Exception as e:
+                results = [e] * len(batch)
+            finished = time.perf_counter()
+
+            self.batch_sizes.append(len(batch))
+            for (_, future, queued), result in zip(batch, results):
+                if future.done():
+                    continue  # client went away
+                if isinstance(result, Exception):
+                    future.set_exception(HTTPException(status_code=500, detail=f"Diagnosis failed: {result}"))
+                    continue
+                if 'error' in result:
+                    # Unreadable upload; the rest of the batch is unaffected
+                    future.set_exception(HTTPException(status_code=400, detail=result['error']))
+                    continue
+                latency_ms = (finished - queued) * 1000
+                self.latencies.append(latency_ms)
+                future.set_result({
+                    **result,
+                    'latency_ms': round(latency_ms, 2),
+                    'queue_ms': round((started - queued) * 1000, 2),
+                    'batch_size': len(batch),
+                })
+
+    def stats(self):
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            'queued': self.queue.qsize(),
+            'requests': len(self.latencies),
+            'mean_batch_size': float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            'latency_ms': {
+                'p50': float(np.percentile(latencies, 50)),
+                'p95': float(np.percentile(latencies, 95)),
+                'p99': float(np.percentile(latencies, 99)),
+            },
+        }
+
+
+detector = CropDiseaseDetector()
+batcher = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global batcher
+    detector.load_model(MODEL_PATH)
+    detector.warmup(batch_sizes=(1, MAX_BATCH_SIZE))
+    batcher = MicroBatcher(detector)
+    batcher.start()
+    yield
+    await batcher.stop()
+
+
+app = FastAPI(title="Crop Disease Detection", lifespan=lifespan)
+
+
+@app.post("/diagnose")
+async def diagnose(file: UploadFile = File(...)):
+    return await batcher.submit(await file.read())
+
+
+@app.get("/stats")
+def stats():
+    return {**batcher.stats(), 'startup': detector.startup_timings()}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8002)
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import operator
+import os
+import time
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import fs
+import csv_stream
+
+# Uploaded CSVs are converted once to uncompressed Arrow IPC files named by
+# content hash, so re-uploading the same file, reruns and other sessions
+# memory-map the columns instead of parsing text again. The summary from
+# the conversion pass is kept in the file's schema metadata. The folder is
+# kept under MAX_CACHE_BYTES by prune_cache.
+CACHE_FOLDER = ".csv_cache"
+CHUNK_SIZE = 1024 * 1024
+# Least recently used files are removed once the folder is bigger than this.
+# Files used within IN_USE_S may still be mapped by a session and are kept.
+MAX_CACHE_BYTES = 10 * 1024 ** 3
+IN_USE_S = 15 * 60
+
+OPERATORS = {
+    "==": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le,
+    ">": operator.gt, ">=": operator.ge,
+    "contains": None,
+}
+
+# Columns csv_stream leaves to pandas get a nullable dtype, so a chunk
+# where they happen to be empty still converts to the same Arrow type
+NULLABLE_DTYPES = {"object": "string", "bool": "boolean"}
+
+def content_hash(file):
+    sha256 = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+def cache_path(sha256):
+    return os.path.join(CACHE_FOLDER, f"{sha256}.arrow")
+
+# Mark a cache file as used; its mtime is the LRU clock (atime is often
+# not updated, e.g. on noatime mounts)
+def touch(path):
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+# Remove least recently used files until the cache fits in max_bytes,
+# never keep itself or files that may still be mapped
+def prune_cache(keep=None, max_bytes=MAX_CACHE_BYTES):
+    entries = []
+    for name in os.listdir(CACHE_FOLDER):
+        path = os.path.join(CACHE_FOLDER, name)
+        if not name.endswith(".arrow"):
+            continue
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    in_use_after = time.time() - IN_USE_S
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep or mtime > in_use_after:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass  # removed by another session, or still mapped (Windows)
+
+# Write the CSV to an Arrow file at part_path, reading it with dtypes.
+# Returns the number of empty values per column as written.
+def _write_arrow(file, part_path, dtypes, metadata):
+    nulls = {c: 0 for c in dtypes}
+    writer = None
+    try:
+        file.seek(0)
+        for chunk in pd.read_csv(file, chunksize=csv_stream.CHUNK_ROWS, dtype=dtypes):
+            if writer is None:
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False).with_metadata(metadata)
+                writer = pa.ipc.new_file(part_path, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            for column, count in chunk.isna().sum().items():
+                nulls[column] += int(count)
+    finally:
+        if writer is not None:
+            writer.close()
+    return nulls
+
+# Arrow file for an uploaded CSV, converting it on first sight: one
+# csv_stream pass picks dtypes and builds the summary, a second writes
+# the record batches. Writes to a uniquely named .part file so a failed
+# or concurrent conversion never leaves a truncated cache entry.
+def convert_csv(file, sha256=None):
+    sha256 = sha256 or content_hash(file)
+    path = cache_path(sha256)
+    if os.path.exists(path):
+        touch(path)
+        return path
+
+    scanned = csv_stream.scan_csv(file)
+    summary = scanned["summary"]
+    dtypes = {c: scanned["dtypes"].get(c, NULLABLE_DTYPES.get(summary.at[c, "dtype"], summary.at[c, "dtype"]))
+              for c in scanned["columns"]}
+
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    part_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        while True:
+            metadata = {"summary": summary.reset_index().to_json(orient="records")}
+            nulls = _write_arrow(file, part_path, dtypes, metadata)
+            # A value missing from a column's categories would be read as
+            # empty; keep such columns as plain strings instead
+            lost = [c for c in nulls if nulls[c] != summary.at[c, "nulls"]
+                    and isinstance(dtypes[c], pd.CategoricalDtype)]
+            if not lost:
+                break
+            for column in lost:
+                dtypes[column] = "string"
+                summary.at[column, "dtype"] = "string"
+        os.replace(part_path, path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    prune_cache(keep=path)
+    return path
+
+# Memory-mapped view of a converted file; nothing is read until queried
+def open_dataset(path):
+    touch(path)
+    return ds.dataset(path, format="ipc", filesystem=fs.LocalFileSystem(use_mmap=True))
+
+# Row count, column names and per-column summary, read from the file footer
+def read_summary(path):
+    dataset = open_dataset(path)
+    summary = pd.DataFrame(json.loads(dataset.schema.metadata[b"summary"])).set_index("column")
+    summary[["min", "max"]] = summary[["min", "max"]].astype("string")
+    return {"rows": dataset.count_rows(), "columns": dataset.schema.names, "summary": summary}
+
+# Dataset expression for one (column, operator, text value) filter, with
+# the value parsed to the column's type
+def filter_expression(schema, column, op, value):
+    field = ds.field(column)
+    value_type = schema.field(column).type
+    if pa.types.is_dictionary(value_type):
+        value_type = value_type.value_type
+        field = field.cast(value_type)
+
+    if op == "contains":
+        return pc.match_substring(field.cast(pa.string()), str(value))
+    if pa.types.is_integer(value_type) or pa.types.is_floating(value_type):
+        value = float(value)
+    elif pa.types.is_boolean(value_type):
+        value = str(value).strip().lower() in ("true", "1", "yes")
+    else:
+        value = str(value)
+    return OPERATORS[op](field, value)
+
+# Rows matching all filters, with only the requested columns read from the
+# file, optionally sorted. The result shares memory with the mapped file
+# unless it had to be sorted.
+def query(path, columns=None, filters=(), sort_by=None, descending=False):
+    dataset = open_dataset(path)
+    columns = list(columns or dataset.schema.names)
+    expression = None
+    for column, op, value in filters:
+        condition = filter_expression(dataset.schema, column, op, value)
+        expression = condition if expression is None else expression & condition
+
+    read_columns = columns + [sort_by] if sort_by and sort_by not in columns else columns
+    table = dataset.to_table(columns=read_columns, filter=expression)
+    if sort_by:
+        sort_type = table.schema.field(sort_by).type
+        if pa.types.is_dictionary(sort_type):
+            # Arrow can't sort dictionary (category) columns, decode just this one
+            index = table.schema.get_field_index(sort_by)
+            table = table.set_column(index, sort_by, table[sort_by].cast(sort_type.value_type))
+        table = table.sort_by([(sort_by, "descending" if descending else "ascending")])
+    return table.select(columns)
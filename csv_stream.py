@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+# Large CSV files without loading them whole: one chunked pass counts the
+# rows, summarises every column and picks compact dtypes to read it with
+# (csv_cache uses them when converting uploads to Arrow).
+
+CHUNK_ROWS = 100_000
+CATEGORY_MAX = 1000     # text columns with at most this many distinct values become category
+INT_TYPES = ["int8", "int16", "int32", "int64"]
+FLOAT32_MAX = 2 ** 24   # float32 is exact for integers below this; larger values keep float64
+KINDS = [None, "bool", "int", "float", "text"]   # each kind can hold the ones before it
+DEFAULT_DTYPES = {None: "object", "bool": "bool", "int": "int64", "float": "float64", "text": "object"}
+
+SUMMARY_FIELDS = ["dtype", "count", "nulls", "min", "max"]
+
+def _kind(series):
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        return "float"   # includes integer columns with empty rows
+    return "text"
+
+def _new_stats():
+    return {"kind": None, "count": 0, "nulls": 0, "min": None, "max": None, "values": set()}
+
+def _fold_range(stats, values):
+    lo, hi = values.min(), values.max()
+    stats["min"] = lo if stats["min"] is None else min(stats["min"], lo)
+    stats["max"] = hi if stats["max"] is None else max(stats["max"], hi)
+
+# Fold one chunk of a column into its running stats
+def _update(stats, series):
+    values = series.dropna()
+    stats["count"] += len(values)
+    stats["nulls"] += len(series) - len(values)
+    if values.empty:
+        return
+
+    stats["kind"] = max(stats["kind"], _kind(series), key=KINDS.index)
+    if stats["kind"] != "text":
+        _fold_range(stats, values)
+
+# Fold one chunk of a text column, read as raw strings, into its values and
+# range. Categories must be the exact text in the file (not "True" for
+# "true", or "7" for "007"), or reading with them turns the rest into NaN.
+def _update_text(stats, series):
+    values = series.dropna()
+    if values.empty:
+        return
+    if stats["values"] is not None:
+        stats["values"].update(values.unique())
+        if len(stats["values"]) > CATEGORY_MAX:
+            stats["values"] = None  # too many to be worth a category
+    _fold_range(stats, values)
+
+# Smallest dtype that holds every value seen, or None to let pandas decide
+def _compact_dtype(stats):
+    kind = stats["kind"]
+    if kind == "float":
+        if max(abs(stats["min"]), abs(stats["max"])) < FLOAT32_MAX:
+            return "float32"
+        return None
+    if kind == "int":
+        for name in INT_TYPES:
+            info = np.iinfo(name)
+            if info.min <= stats["min"] and stats["max"] <= info.max:
+                # Nullable Int when some rows are empty
+                return name.capitalize() if stats["nulls"] else name
+    if kind == "text" and stats["values"] is not None:
+        # Fixed categories, so every chunk is read with the same ones
+        return pd.CategoricalDtype(sorted(stats["values"]))
+    return None
+
+def _plain(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+# One pass over a CSV file (path or file-like object), CHUNK_ROWS at a time,
+# plus a second over just the text columns if there are any. Returns the row
+# count, column names, compact dtypes to read it with and a per-column
+# summary frame (dtype, count, nulls, min, max).
+def scan_csv(file, chunk_rows=CHUNK_ROWS):
+    if hasattr(file, "seek"):
+        file.seek(0)
+    rows = 0
+    stats = {}
+    for chunk in pd.read_csv(file, chunksize=chunk_rows, low_memory=False):
+        rows += len(chunk)
+        for column in chunk.columns:
+            _update(stats.setdefault(column, _new_stats()), chunk[column])
+
+    # A column only known to be text once every chunk is seen (numbers
+    # first, or bools with blanks) is re-read as the raw strings
+    text_columns = [c for c, s in stats.items() if s["kind"] == "text"]
+    if text_columns:
+        for column in text_columns:
+            stats[column]["min"] = stats[column]["max"] = None  # numeric until proven otherwise
+        if hasattr(file, "seek"):
+            file.seek(0)
+        for chunk in pd.read_csv(file, chunksize=chunk_rows, usecols=text_columns, dtype=str):
+            for column in text_columns:
+                _update_text(stats[column], chunk[column])
+
+    columns = list(stats)
+    dtypes = {c: _compact_dtype(s) for c, s in stats.items()}
+    summary = pd.DataFrame(
+        [[str(dtypes[c] or DEFAULT_DTYPES[s["kind"]]), s["count"], s["nulls"], _plain(s["min"]), _plain(s["max"])]
+         for c, s in stats.items()],
+        index=pd.Index(columns, name="column"), columns=SUMMARY_FIELDS,
+    )
+    # Mixed numbers and text can't share an Arrow column
+    summary["min"] = summary["min"].astype("string")
+    summary["max"] = summary["max"].astype("string")
+    return {
+        "rows": rows,
+        "columns": columns,
+        "dtypes": {c: d for c, d in dtypes.items() if d is not None},
+        "summary": summary,
+    }
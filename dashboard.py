@@ -1,15 +1,59 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
+from storage import pick_resolution, DEFAULT_DEVICE
+from dashboard_cache import (
+    data_version, window_bounds, load_latest, load_range, load_since, load_rollup, SINCE_LIMIT
+)
 
 st.title("📊 ESP32 IoT Dashboard (Random Data)")
 
-conn = sqlite3.connect("iot.db")
-df = pd.read_sql("SELECT * FROM data ORDER BY id DESC LIMIT 20", conn)
+# Chart windows in milliseconds
+WINDOWS = {
+    "Last hour": 60 * 60 * 1000,
+    "Last 24 hours": 24 * 60 * 60 * 1000,
+    "Last 7 days": 7 * 24 * 60 * 60 * 1000,
+    "Last 30 days": 30 * 24 * 60 * 60 * 1000,
+}
 
-if len(df) > 0:
-    st.metric("🌡 Temperature (°C)", df.iloc[0]["temperature"])
-    st.metric("💧 Humidity (%)", df.iloc[0]["humidity"])
-    st.line_chart(df[["temperature", "humidity"]])
+# Raw readings for a short window. The frame is kept in the session and
+# each rerun only fetches rows added since the last one (since_id cursor).
+def load_raw(window, start_ms, end_ms, version):
+    cache = st.session_state.get("raw_cache")
+
+    if cache is None or cache["window"] != window:
+        df = load_range(start_ms, end_ms, version, DEFAULT_DEVICE)
+        last_id = int(df["id"].iloc[-1]) if len(df) else version
+        cache = {"window": window, "df": df, "last_id": last_id}
+    elif version > cache["last_id"]:
+        new = load_since(cache["last_id"], version, DEFAULT_DEVICE)
+        df = pd.concat([cache["df"], new], ignore_index=True)
+        # A full page means more rows are waiting; continue from the last one
+        cache["last_id"] = version if len(new) < SINCE_LIMIT else int(new["id"].iloc[-1])
+        # Drop readings that have slid out of the window
+        cache["df"] = df.iloc[df["ts"].searchsorted(start_ms):]
+
+    st.session_state.raw_cache = cache
+    return cache["df"]
+
+window = st.selectbox("Time window", list(WINDOWS.keys()))
+start_ms, end_ms = window_bounds(WINDOWS[window])
+version = data_version()
+
+latest = load_latest(version, DEFAULT_DEVICE)
+
+if len(latest) > 0:
+    st.metric("🌡 Temperature (°C)", latest.iloc[0]["temperature"])
+    st.metric("💧 Humidity (%)", latest.iloc[0]["humidity"])
+
+    # Raw rows for short windows, rollup buckets for long ones
+    source = pick_resolution(start_ms, end_ms) or "data"
+    if source == "data":
+        df = load_raw(window, start_ms, end_ms, version)
+    else:
+        df = load_rollup(start_ms, end_ms, version, DEFAULT_DEVICE)
+    chart = df.set_index(pd.to_datetime(df["ts"], unit="ms"))
+
+    st.caption(f"{len(df)} points from `{source}`")
+    st.line_chart(chart[["temperature", "humidity"]])
 else:
     st.info("Waiting for ESP32 data...")
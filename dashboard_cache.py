@@ -0,0 +1,56 @@
+import streamlit as st
+import pandas as pd
+import storage
+
+# Shared, cached reads for the Streamlit dashboards.
+# Every loader takes the current data version (max row id) as an argument,
+# so all viewers share one result until new readings are ingested, and
+# TTL bounds how long an idle entry stays in memory.
+
+REFRESH_MS = 5000   # window ends are rounded up to this, so viewers share keys
+CACHE_TTL_S = 60
+CACHE_ENTRIES = 64
+SINCE_LIMIT = 5000  # most new rows fetched per refresh
+
+RAW_COLUMNS = ["id", "ts", "temperature", "humidity"]
+
+# One connection (and one schema migration) per server process
+@st.cache_resource
+def get_db(path=storage.DB_PATH):
+    storage.init_db(path)
+    return storage.connect(path)
+
+# Cheap probe that changes whenever new readings are ingested
+def data_version():
+    return get_db().execute("SELECT COALESCE(MAX(id), 0) FROM data").fetchone()[0]
+
+# (start_ms, end_ms) for a window of the given length ending now
+def window_bounds(duration_ms):
+    end_ms = -(-storage.now_ms() // REFRESH_MS) * REFRESH_MS
+    return end_ms - duration_ms, end_ms
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_ENTRIES)
+def load_latest(version, device_id=storage.DEFAULT_DEVICE):
+    return pd.read_sql(
+        "SELECT * FROM data WHERE device_id = ? ORDER BY ts DESC LIMIT 1",
+        get_db(), params=(device_id,)
+    )
+
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_ENTRIES)
+def load_range(start_ms, end_ms, version, device_id=storage.DEFAULT_DEVICE):
+    rows = storage.query_range(start_ms, end_ms, device_id, conn=get_db())
+    return pd.DataFrame([(r[0], r[2], r[3], r[4]) for r in rows], columns=RAW_COLUMNS)
+
+# Rows with since_id < id <= version, so a cursor can move to version safely
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_ENTRIES)
+def load_since(since_id, version, device_id=storage.DEFAULT_DEVICE):
+    rows = storage.query_since(since_id, device_id, SINCE_LIMIT, conn=get_db())
+    df = pd.DataFrame(rows, columns=RAW_COLUMNS)
+    return df[df["id"] <= version]
+
+# Rollup buckets with mean columns renamed for charting
+@st.cache_data(ttl=CACHE_TTL_S, max_entries=CACHE_ENTRIES)
+def load_rollup(start_ms, end_ms, version, device_id=storage.DEFAULT_DEVICE):
+    source, sql, params = storage.window_query(start_ms, end_ms, device_id)
+    df = pd.read_sql(sql, get_db(), params=params)
+    return df.rename(columns={"temperature_mean": "temperature", "humidity_mean": "humidity"})
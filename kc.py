@@ -1,19 +1,28 @@
 import streamlit as st
-import json
 import os
 from datetime import datetime
 import hashlib
+from attachments import (
+    ATTACHMENTS_FOLDER, stage_upload, discard_uploads, blob_path, delete_project_folder, file_loader
+)
+from thumbnails import get_thumbnail, background_data_uri
+from project_store import (
+    init_projects_db, count_projects, list_project_page, get_project,
+    insert_project, update_project, delete_project
+)
 
 # Configuration
-PROJECTS_FILE = "projects_data.json"
-ATTACHMENTS_FOLDER = "project_attachments"
 PASSWORD_HASH = hashlib.sha256("adminadmin".encode()).hexdigest()  # Default password: admin123
 PROFILE_IMAGE = "profile.jpeg"  # Place your profile image in the same folder
+PAGE_SIZE = 20  # projects listed per page on View Projects
 
 # Create attachments folder if it doesn't exist
 if not os.path.exists(ATTACHMENTS_FOLDER):
     os.makedirs(ATTACHMENTS_FOLDER)
 
+# Create the projects database (imports projects_data.json the first time)
+init_projects_db()
+
 # Initialize session state
 if 'view_authenticated' not in st.session_state:
     st.session_state.view_authenticated = False
@@ -26,18 +35,6 @@ if 'edit_mode' not in st.session_state:
 if 'last_saved_state' not in st.session_state:
     st.session_state.last_saved_state = None
 
-# Load projects from file
-def load_projects():
-    if os.path.exists(PROJECTS_FILE):
-        with open(PROJECTS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
-
-# Save projects to file
-def save_projects(projects):
-    with open(PROJECTS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(projects, indent=4, fp=f, ensure_ascii=False)
-
 # Check if project has changes
 def has_changes(current_data):
     if st.session_state.last_saved_state is None:
@@ -56,14 +53,13 @@ menu = st.sidebar.radio("Navigation", ["Add Project", "View Projects", "About Me
 if menu == "Add Project":
     # Add background image CSS for Add Project page
     if os.path.exists("image.png"):
-        import base64
-        with open("image.png", "rb") as img_file:
-            img_data = base64.b64encode(img_file.read()).decode()
+        # Resized once and encoded once per image content, not on every render
+        img_uri = background_data_uri("image.png")
         
         st.markdown(f"""
         <style>
             .stApp {{
-                background-image: url("data:image/png;base64,{img_data}");
+                background-image: url("{img_uri}");
                 background-size: cover;
                 background-position: center;
                 background-repeat: no-repeat;
@@ -109,24 +105,22 @@ if menu == "Add Project":
     
     if submit:
         if title and writer and description:
-            projects = load_projects()
             project_id = generate_project_id()
             
             # Handle file uploads
             attached_files = []
             if uploaded_files:
-                project_folder = os.path.join(ATTACHMENTS_FOLDER, project_id)
-                os.makedirs(project_folder, exist_ok=True)
-                
                 for uploaded_file in uploaded_files:
-                    file_path = os.path.join(project_folder, uploaded_file.name)
-                    with open(file_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
+                    # Same content is stored once, whatever project or name;
+                    # insert_project commits it to the blob store
+                    saved = stage_upload(uploaded_file)
                     
                     attached_files.append({
                         "name": uploaded_file.name,
-                        "size": uploaded_file.size,
-                        "type": uploaded_file.type
+                        "size": saved["size"],
+                        "type": uploaded_file.type,
+                        "sha256": saved["sha256"],
+                        "tmp_path": saved["tmp_path"]
                     })
             
             # Create project data
@@ -142,14 +136,14 @@ if menu == "Add Project":
             
             # Check if changes exist
             if has_changes(project_data):
-                projects.append(project_data)
-                save_projects(projects)
+                insert_project(project_data)
                 st.session_state.last_saved_state = project_data.copy()
                 st.success(" Project saved successfully!")
                 if attached_files:
                     st.info(f"📎 {len(attached_files)} file(s) attached successfully!")
                 st.balloons()
             else:
+                discard_uploads(attached_files)
                 st.info("ℹ No changes detected. Project already saved.")
         else:
             st.error(" Please fill in all fields before saving!")
@@ -171,10 +165,20 @@ elif menu == "View Projects":
                     st.error(" Incorrect password!")
         st.stop()
     
-    projects = load_projects()
+    # Search and paging: only titles of the visible page are loaded
+    search = st.text_input(" Search projects", placeholder="Search title, writer or description...")
+    total = count_projects(search)
+    page_count = max(1, -(-total // PAGE_SIZE))
+    page = 1
+    if page_count > 1:
+        page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1)
+    projects = list_project_page(page - 1, PAGE_SIZE, search)
     
     if not projects:
-        st.info("No projects found. Add a new project to get started!")
+        if search.strip():
+            st.info("No projects match your search.")
+        else:
+            st.info("No projects found. Add a new project to get started!")
     else:
         # Lock button to logout
         if st.button(" Lock View", type="secondary"):
@@ -184,11 +188,12 @@ elif menu == "View Projects":
             st.rerun()
         
         # Project selector
-        project_titles = [f"{p['title']} (by {p['writer']})" for p in projects]
-        selected_index = st.selectbox("Select a project to view:", range(len(projects)), 
+        project_titles = [f"{p['title']} (by {p['writer']}, {p['created_at'][:10]})" for p in projects]
+        selected_index = st.selectbox(f"Select a project to view ({total} found):", range(len(projects)), 
                                       format_func=lambda x: project_titles[x])
         
-        selected_project = projects[selected_index]
+        # Full description and attachments only for the opened project
+        selected_project = get_project(projects[selected_index]['id'])
         
         st.divider()
         
@@ -225,14 +230,9 @@ elif menu == "View Projects":
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("Yes, Delete", type="primary", use_container_width=True):
-                    # Delete project files if any
-                    project_folder = os.path.join(ATTACHMENTS_FOLDER, selected_project['id'])
-                    if os.path.exists(project_folder):
-                        import shutil
-                        shutil.rmtree(project_folder)
-                    
-                    projects.pop(selected_index)
-                    save_projects(projects)
+                    # Deletes any files no other project uses along with it
+                    delete_project(selected_project['id'])
+                    delete_project_folder(selected_project['id'])
                     st.session_state.delete_confirm = False
                     st.success("Project deleted successfully!")
                     st.rerun()
@@ -273,19 +273,17 @@ elif menu == "View Projects":
             if save_changes:
                 # Handle new file uploads
                 existing_attachments = selected_project.get('attachments', [])
+                new_attachments = []
                 if new_uploaded_files:
-                    project_folder = os.path.join(ATTACHMENTS_FOLDER, selected_project['id'])
-                    os.makedirs(project_folder, exist_ok=True)
-                    
                     for uploaded_file in new_uploaded_files:
-                        file_path = os.path.join(project_folder, uploaded_file.name)
-                        with open(file_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
+                        saved = stage_upload(uploaded_file)
                         
-                        existing_attachments.append({
+                        new_attachments.append({
                             "name": uploaded_file.name,
-                            "size": uploaded_file.size,
-                            "type": uploaded_file.type
+                            "size": saved["size"],
+                            "type": uploaded_file.type,
+                            "sha256": saved["sha256"],
+                            "tmp_path": saved["tmp_path"]
                         })
                 
                 updated_project = {
@@ -293,7 +291,7 @@ elif menu == "View Projects":
                     "title": new_title,
                     "writer": new_writer,
                     "description": new_description,
-                    "attachments": existing_attachments,
+                    "attachments": existing_attachments + new_attachments,
                     "created_at": selected_project['created_at'],
                     "last_modified": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 }
@@ -304,8 +302,7 @@ elif menu == "View Projects":
                     new_description != selected_project['description'] or
                     new_uploaded_files):
                     
-                    projects[selected_index] = updated_project
-                    save_projects(projects)
+                    update_project(updated_project, new_attachments)
                     st.success(" Changes saved successfully!")
                     if new_uploaded_files:
                         st.info(f"📎 {len(new_uploaded_files)} new file(s) added!")
@@ -313,6 +310,7 @@ elif menu == "View Projects":
                     st.session_state.authenticated = False
                     st.rerun()
                 else:
+                    discard_uploads(new_attachments)
                     st.info(" No changes detected.")
             
             if cancel_edit:
@@ -337,21 +335,24 @@ elif menu == "View Projects":
                 st.divider()
                 st.markdown("### 📎 Attached Files")
                 for attachment in selected_project['attachments']:
-                    file_path = os.path.join(ATTACHMENTS_FOLDER, selected_project['id'], attachment['name'])
-                    if os.path.exists(file_path):
+                    file_path = blob_path(attachment['sha256']) if attachment.get('sha256') else None
+                    if file_path and os.path.exists(file_path):
                         col1, col2, col3 = st.columns([3, 1, 1])
                         with col1:
                             st.markdown(f" **{attachment['name']}**")
                             st.caption(f"Size: {attachment['size'] / 1024:.2f} KB")
+                            if (attachment['type'] or "").startswith("image/"):
+                                st.image(get_thumbnail(file_path, 240, sha256=attachment['sha256']), width=240)
                         with col2:
-                            with open(file_path, "rb") as file:
-                                st.download_button(
-                                    label="Download",
-                                    data=file,
-                                    file_name=attachment['name'],
-                                    mime=attachment['type'],
-                                    use_container_width=True
-                                )
+                            # File is read only when Download is clicked
+                            st.download_button(
+                                label="Download",
+                                data=file_loader(file_path),
+                                file_name=attachment['name'],
+                                mime=attachment['type'],
+                                on_click="ignore",
+                                use_container_width=True
+                            )
                     else:
                         st.warning(f"⚠️ File not found: {attachment['name']}")
 
@@ -362,7 +363,7 @@ elif menu == "About Me":
     
     with col1:
         if os.path.exists(PROFILE_IMAGE):
-            st.image(PROFILE_IMAGE, width=200)
+            st.image(get_thumbnail(PROFILE_IMAGE, 200), width=200)
         else:
             st.info(" My profile picture as 'profile.jpg' in the project folder")
     
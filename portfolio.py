@@ -1,9 +1,10 @@
 import streamlit as st
 from datetime import datetime
+from thumbnails import get_thumbnail
 
 st.title("🇳🇵 .com.np Domain Registration Cover Letter Generator")
 with st.sidebar:
-    st.image("kailashprofile.jpeg", width=500)
+    st.image(get_thumbnail("kailashprofile.jpeg", 500), width=500)
     st.markdown("""
     ### Introduction
     This application helps you generate a cover letter for registering a .com.np domain.
@@ -0,0 +1,373 @@
+import itertools
+import json
+import os
+import sqlite3
+from storage import connection, column_names
+from attachments import (
+    ATTACHMENTS_FOLDER, store_file, commit_uploads, discard_uploads, delete_blobs
+)
+
+PROJECTS_DB = "projects.db"
+PROJECTS_JSON = "projects_data.json"   # old storage, imported once
+
+PROJECT_FIELDS = ["id", "title", "writer", "description", "created_at", "last_modified"]
+SUMMARY_FIELDS = ["id", "title", "writer", "created_at"]
+ATTACHMENT_FIELDS = ["name", "size", "type", "sha256"]
+
+# Pooled connection to projects.db, as a context manager
+def get_db(path=PROJECTS_DB):
+    return connection(path)
+
+def init_projects_db(path=PROJECTS_DB, json_path=PROJECTS_JSON):
+    with get_db(path) as conn:
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS projects (
+                    id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    writer TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    last_modified TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS attachments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    project_id TEXT NOT NULL REFERENCES projects(id),
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    type TEXT,
+                    sha256 TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_attachments_project ON attachments(project_id)")
+        migrate(conn, json_path)
+
+# Upgrade projects.db in place, tracked with PRAGMA user_version
+def migrate(conn, json_path=PROJECTS_JSON):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    if version < 1:
+        migrate_from_json(conn, json_path)
+
+    if version < 2:
+        # Full-text index over title, writer and description, kept in sync by
+        # triggers, plus an index for paging through projects in date order
+        with conn:
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_projects_created ON projects(created_at, id)")
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS projects_fts USING fts5(
+                    project_id UNINDEXED, title, writer, description
+                )
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS projects_fts_insert AFTER INSERT ON projects BEGIN
+                    INSERT INTO projects_fts (project_id, title, writer, description)
+                    VALUES (new.id, new.title, new.writer, new.description);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS projects_fts_delete AFTER DELETE ON projects BEGIN
+                    DELETE FROM projects_fts WHERE project_id = old.id;
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS projects_fts_update AFTER UPDATE ON projects BEGIN
+                    UPDATE projects_fts
+                    SET title = new.title, writer = new.writer, description = new.description
+                    WHERE project_id = old.id;
+                END
+            """)
+            conn.execute("DELETE FROM projects_fts")
+            conn.execute("""
+                INSERT INTO projects_fts (project_id, title, writer, description)
+                SELECT id, title, writer, description FROM projects
+            """)
+            conn.execute("PRAGMA user_version = 2")
+
+    if version < 3:
+        # Content hash of each attachment, computed while it is uploaded
+        with conn:
+            if "sha256" not in column_names(conn, "attachments"):
+                conn.execute("ALTER TABLE attachments ADD COLUMN sha256 TEXT")
+            conn.execute("PRAGMA user_version = 3")
+
+    if version < 4:
+        migrate_to_blobs(conn)
+
+    if version < 5:
+        # Replace the standalone FTS table (keyed by an UNINDEXED project_id,
+        # so its update/delete triggers scanned the whole index) with an
+        # external-content one keyed by projects.rowid
+        with conn:
+            for trigger in ("insert", "delete", "update"):
+                conn.execute(f"DROP TRIGGER IF EXISTS projects_fts_{trigger}")
+            conn.execute("DROP TABLE IF EXISTS projects_fts")
+            conn.execute("""
+                CREATE VIRTUAL TABLE projects_fts USING fts5(
+                    title, writer, description, content='projects', content_rowid='rowid'
+                )
+            """)
+            conn.execute("""
+                CREATE TRIGGER projects_fts_insert AFTER INSERT ON projects BEGIN
+                    INSERT INTO projects_fts (rowid, title, writer, description)
+                    VALUES (new.rowid, new.title, new.writer, new.description);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER projects_fts_delete AFTER DELETE ON projects BEGIN
+                    INSERT INTO projects_fts (projects_fts, rowid, title, writer, description)
+                    VALUES ('delete', old.rowid, old.title, old.writer, old.description);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER projects_fts_update AFTER UPDATE ON projects BEGIN
+                    INSERT INTO projects_fts (projects_fts, rowid, title, writer, description)
+                    VALUES ('delete', old.rowid, old.title, old.writer, old.description);
+                    INSERT INTO projects_fts (rowid, title, writer, description)
+                    VALUES (new.rowid, new.title, new.writer, new.description);
+                END
+            """)
+            conn.execute("INSERT INTO projects_fts (projects_fts) VALUES ('rebuild')")
+            conn.execute("PRAGMA user_version = 5")
+
+    if version < 6:
+        # projects has a TEXT primary key, so VACUUM may renumber its implicit
+        # rowids and leave the search index pointing at the wrong projects.
+        # Rebuild it with an INTEGER PRIMARY KEY (which VACUUM keeps) and key
+        # the index by that instead.
+        with conn:
+            conn.execute("DROP TABLE projects_fts")
+            conn.execute("""
+                CREATE TABLE projects_new (
+                    seq INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL UNIQUE,
+                    title TEXT NOT NULL,
+                    writer TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    last_modified TEXT NOT NULL
+                )
+            """)
+            fields = ", ".join(PROJECT_FIELDS)
+            conn.execute(f"INSERT INTO projects_new (seq, {fields}) SELECT rowid, {fields} FROM projects")
+            conn.execute("DROP TABLE projects")   # and its triggers and index
+            conn.execute("ALTER TABLE projects_new RENAME TO projects")
+            conn.execute("CREATE INDEX idx_projects_created ON projects(created_at, id)")
+            conn.execute("""
+                CREATE VIRTUAL TABLE projects_fts USING fts5(
+                    title, writer, description, content='projects', content_rowid='seq'
+                )
+            """)
+            conn.execute("""
+                CREATE TRIGGER projects_fts_insert AFTER INSERT ON projects BEGIN
+                    INSERT INTO projects_fts (rowid, title, writer, description)
+                    VALUES (new.seq, new.title, new.writer, new.description);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER projects_fts_delete AFTER DELETE ON projects BEGIN
+                    INSERT INTO projects_fts (projects_fts, rowid, title, writer, description)
+                    VALUES ('delete', old.seq, old.title, old.writer, old.description);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER projects_fts_update AFTER UPDATE ON projects BEGIN
+                    INSERT INTO projects_fts (projects_fts, rowid, title, writer, description)
+                    VALUES ('delete', old.seq, old.title, old.writer, old.description);
+                    INSERT INTO projects_fts (rowid, title, writer, description)
+                    VALUES (new.seq, new.title, new.writer, new.description);
+                END
+            """)
+            conn.execute("INSERT INTO projects_fts (projects_fts) VALUES ('rebuild')")
+            conn.execute("PRAGMA user_version = 6")
+
+# Copy attachments from project_attachments/<project_id>/<name> into the
+# content-addressed blob store and start counting references per blob.
+# The old copies are left in place (some are checked in); deleting a
+# project still removes its legacy folder.
+def migrate_to_blobs(conn):
+    imported = []
+    for attachment_id, project_id, name in conn.execute(
+        "SELECT id, project_id, name FROM attachments"
+    ).fetchall():
+        legacy_path = os.path.join(ATTACHMENTS_FOLDER, project_id, name)
+        if os.path.exists(legacy_path):
+            imported.append((store_file(legacy_path)["sha256"], attachment_id))
+
+    with conn:
+        conn.executemany(
+            "UPDATE attachments SET sha256 = ? WHERE id = ?",
+            imported
+        )
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                refcount INTEGER NOT NULL
+            )
+        """)
+        conn.execute("""
+            INSERT OR REPLACE INTO blobs
+            SELECT sha256, MAX(size), COUNT(*) FROM attachments
+            WHERE sha256 IS NOT NULL GROUP BY sha256
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS attachments_blob_insert AFTER INSERT ON attachments
+            WHEN new.sha256 IS NOT NULL BEGIN
+                INSERT INTO blobs VALUES (new.sha256, new.size, 1)
+                ON CONFLICT (sha256) DO UPDATE SET refcount = refcount + 1;
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS attachments_blob_delete AFTER DELETE ON attachments
+            WHEN old.sha256 IS NOT NULL BEGIN
+                UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = old.sha256;
+            END
+        """)
+        conn.execute("PRAGMA user_version = 4")
+
+# One-time import of projects_data.json; the JSON file is left untouched
+def migrate_from_json(conn, json_path=PROJECTS_JSON):
+    projects = []
+    if os.path.exists(json_path):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            projects = json.load(f)
+
+    with conn:
+        for project in projects:
+            conn.execute(
+                f"INSERT OR IGNORE INTO projects ({', '.join(PROJECT_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                [project[k] for k in PROJECT_FIELDS]
+            )
+            if conn.execute("SELECT changes()").fetchone()[0]:
+                insert_attachments(conn, project['id'], project.get('attachments', []))
+        conn.execute("PRAGMA user_version = 1")
+    return len(projects)
+
+# Turn what the user typed into an FTS5 query: every word must match,
+# as a prefix, so "led blin" finds "LED blinker"
+def to_fts_query(text):
+    words = [w.replace('"', '""') for w in text.split()]
+    return " ".join(f'"{w}"*' for w in words)
+
+def count_projects(search=None, path=PROJECTS_DB):
+    with get_db(path) as conn:
+        if search and search.strip():
+            return conn.execute(
+                "SELECT COUNT(*) FROM projects_fts WHERE projects_fts MATCH ?",
+                (to_fts_query(search),)
+            ).fetchone()[0]
+        return conn.execute("SELECT COUNT(*) FROM projects").fetchone()[0]
+
+# One page of id/title/writer/created_at; descriptions and attachments
+# are only loaded by get_project() when a project is opened.
+# Search results are ranked by relevance, otherwise oldest first.
+def list_project_page(page, page_size, search=None, path=PROJECTS_DB):
+    columns = ", ".join(f"p.{f}" for f in SUMMARY_FIELDS)
+    offset = page * page_size
+    with get_db(path) as conn:
+        if search and search.strip():
+            rows = conn.execute(f"""
+                SELECT {columns}
+                FROM projects_fts JOIN projects p ON p.seq = projects_fts.rowid
+                WHERE projects_fts MATCH ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            """, (to_fts_query(search), page_size, offset))
+        else:
+            rows = conn.execute(f"""
+                SELECT {columns}
+                FROM projects p
+                ORDER BY p.created_at, p.id
+                LIMIT ? OFFSET ?
+            """, (page_size, offset))
+        return [dict(zip(SUMMARY_FIELDS, row)) for row in rows]
+
+def insert_attachments(conn, project_id, attachments):
+    conn.executemany(
+        "INSERT INTO attachments (project_id, name, size, type, sha256) VALUES (?, ?, ?, ?, ?)",
+        [(project_id, a['name'], a['size'], a['type'], a.get('sha256')) for a in attachments]
+    )
+
+def select_attachments(conn, project_id):
+    rows = conn.execute(
+        "SELECT name, size, type, sha256 FROM attachments WHERE project_id = ? ORDER BY id",
+        (project_id,)
+    )
+    return [dict(zip(ATTACHMENT_FIELDS, row)) for row in rows]
+
+def get_attachments(project_id, path=PROJECTS_DB):
+    with get_db(path) as conn:
+        return select_attachments(conn, project_id)
+
+# Project dict in the same shape projects_data.json used
+def get_project(project_id, path=PROJECTS_DB):
+    with get_db(path) as conn:
+        row = conn.execute(
+            f"SELECT {', '.join(PROJECT_FIELDS)} FROM projects WHERE id = ?", (project_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        project = dict(zip(PROJECT_FIELDS, row))
+        project['attachments'] = select_attachments(conn, project_id)
+        return project
+
+# Staged uploads (attachments with a tmp_path, see attachments.stage_upload)
+# are committed to the blob store while the insert holds the write lock,
+# and discarded if it fails. Ids only have one-second resolution, so if
+# another session already saved one with this id it gets a -2, -3, ...
+# suffix; project['id'] is updated and returned.
+def insert_project(project, path=PROJECTS_DB):
+    attachments = project.get('attachments', [])
+    base_id = project['id']
+    try:
+        for suffix in itertools.count(2):
+            try:
+                with get_db(path) as conn, conn:
+                    conn.execute(
+                        f"INSERT INTO projects ({', '.join(PROJECT_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                        [project[k] for k in PROJECT_FIELDS]
+                    )
+                    insert_attachments(conn, project['id'], attachments)
+                    commit_uploads(attachments)
+                return project['id']
+            except sqlite3.IntegrityError as e:
+                if "projects.id" not in str(e):
+                    raise
+                project['id'] = f"{base_id}-{suffix}"
+    finally:
+        discard_uploads(attachments)
+
+# Update title/writer/description/last_modified and append new attachments
+def update_project(project, new_attachments=(), path=PROJECTS_DB):
+    try:
+        with get_db(path) as conn, conn:
+            conn.execute(
+                "UPDATE projects SET title = ?, writer = ?, description = ?, last_modified = ? WHERE id = ?",
+                (project['title'], project['writer'], project['description'],
+                 project['last_modified'], project['id'])
+            )
+            insert_attachments(conn, project['id'], new_attachments)
+            commit_uploads(new_attachments)
+    finally:
+        discard_uploads(new_attachments)
+
+# Delete a project and the blobs nothing references any more, returning
+# their hashes. The files are removed before the transaction commits, so a
+# concurrent insert_project either sees them gone and commits its own copy,
+# or has already added its reference and keeps the blob alive.
+def delete_project(project_id, path=PROJECTS_DB):
+    with get_db(path) as conn, conn:
+        conn.execute("DELETE FROM attachments WHERE project_id = ?", (project_id,))
+        conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+        orphans = collect_garbage(conn)
+        delete_blobs(orphans)
+        return orphans
+
+# Drop blob rows with no references left and return their hashes
+def collect_garbage(conn):
+    orphans = [row[0] for row in conn.execute("SELECT sha256 FROM blobs WHERE refcount <= 0")]
+    conn.execute("DELETE FROM blobs WHERE refcount <= 0")
+    return orphans
@@ -1,35 +1,113 @@
 import streamlit as st
 import requests
 import pandas as pd
+import json
 import time
 
 API_URL = "http://localhost:8001/data"  # change after deployment
+STREAM_URL = "http://localhost:8001/stream"
+MAX_ROWS = 5000  # readings kept in the cached frame
+REBUILD_ROWS = 1000  # streamed readings collected before they are merged into the frame
+REDRAW_S = 1  # how often the chart is redrawn while readings stream in
+FETCH_TTL_S = 2  # viewers connecting within this window share one fetch
 
 st.set_page_config(page_title="IoT Dashboard", layout="centered")
 st.title("🌡 ESP32 IoT Live Dashboard")
 
 placeholder = st.empty()
 
+# Cached frame and since_id cursor, kept across reruns and reconnects.
+# Readings from the stream are collected in `pending` and merged on reconnect,
+# which happens at least every REBUILD_ROWS readings so `pending` stays
+# bounded; the chart is redrawn from the last MAX_ROWS readings.
+if "frame" not in st.session_state:
+    st.session_state.frame = None
+    st.session_state.pending = []
+    st.session_state.last_id = 0
+
+# Chart frame indexed by reading time
+def to_frame(data):
+    df = pd.DataFrame(data, columns=["id", "ts", "temperature", "humidity"])
+    df.index = pd.to_datetime(df.pop("ts"), unit="ms")
+    return df.astype({"temperature": float, "humidity": float})
+
+def reset_cache():
+    st.session_state.frame = None
+    st.session_state.pending = []
+    st.session_state.last_id = 0
+
+# GET /data, shared by every session of this Streamlit server
+@st.cache_data(ttl=FETCH_TTL_S, max_entries=64)
+def fetch_data(since_id=None):
+    params = {} if since_id is None else {"since_id": since_id}
+    return requests.get(API_URL, params=params, timeout=5).json()
+
+# Bounded history on first connect; afterwards only readings newer than last_id
+def refresh_frame():
+    if st.session_state.frame is None:
+        new = fetch_data()
+        parts = [to_frame(new)]
+    else:
+        new = fetch_data(st.session_state.last_id)
+        parts = [st.session_state.frame, to_frame(st.session_state.pending), to_frame(new)]
+
+    df = pd.concat(parts).tail(MAX_ROWS)
+    st.session_state.frame = df
+    st.session_state.pending = []
+    if len(df):
+        st.session_state.last_id = int(df["id"].iloc[-1])
+    return df
+
+# New readings pushed by the API (Server-Sent Events), starting after since_id
+def stream_readings(since_id):
+    params = {"since_id": since_id}
+    with requests.get(STREAM_URL, params=params, stream=True, timeout=(5, 30)) as res:
+        for line in res.iter_lines(decode_unicode=True):
+            if line and line.startswith("data:"):
+                yield json.loads(line[5:])
+
 while True:
     try:
-        res = requests.get(API_URL)
-        data = res.json()
-
-        if data:
-            df = pd.DataFrame(data)
-            df["temperature"] = df["temperature"].astype(float)
-            df["humidity"] = df["humidity"].astype(float)
+        df = refresh_frame()
 
-            with placeholder.container():
-                st.subheader("Latest Readings")
-                st.metric("Temperature (°C)", df.iloc[-1]["temperature"])
-                st.metric("Humidity (%)", df.iloc[-1]["humidity"])
+        with placeholder.container():
+            st.subheader("Latest Readings")
+            temp_metric = st.empty()
+            hum_metric = st.empty()
+            waiting = st.empty()
+            chart_slot = st.empty()
+            chart_slot.line_chart(df[["temperature", "humidity"]])
+        drawn_at = time.monotonic()
 
-                st.line_chart(df[["temperature", "humidity"]])
+        if len(df):
+            temp_metric.metric("Temperature (°C)", df.iloc[-1]["temperature"])
+            hum_metric.metric("Humidity (%)", df.iloc[-1]["humidity"])
         else:
-            st.warning("Waiting for ESP32 data...")
+            waiting.warning("Waiting for ESP32 data...")
+
+        for entry in stream_readings(st.session_state.last_id):
+            if entry["id"] <= st.session_state.last_id:
+                # Sequence ids went backwards: the API restarted, start over
+                reset_cache()
+                break
+            if entry["id"] > st.session_state.last_id + 1:
+                # Readings were skipped (this client fell behind the stream);
+                # reconnecting refetches everything after last_id
+                break
+            st.session_state.pending.append(entry)
+            st.session_state.last_id = entry["id"]
+
+            waiting.empty()
+            temp_metric.metric("Temperature (°C)", entry["temperature"])
+            hum_metric.metric("Humidity (%)", entry["humidity"])
+            if time.monotonic() - drawn_at >= REDRAW_S:
+                recent = pd.concat([df, to_frame(st.session_state.pending)]).tail(MAX_ROWS)
+                chart_slot.line_chart(recent[["temperature", "humidity"]])
+                drawn_at = time.monotonic()
+            if len(st.session_state.pending) >= REBUILD_ROWS:
+                break  # merge into the frame and redraw the last MAX_ROWS
 
-    except:
-        st.error("API not reachable")
+    except requests.RequestException:
+        placeholder.error("API not reachable")
 
     time.sleep(2)
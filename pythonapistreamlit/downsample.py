@@ -0,0 +1,56 @@
+import numpy as np
+
+# Largest-Triangle-Three-Buckets downsampling.
+# x: 1-D array of times, ys: 1-D array or 2-D (n, series) array of values.
+# Returns the indices of at most n_out points that keep the visual shape;
+# with several series each one's triangle area is scaled by its own range
+# so temperature and humidity count equally.
+def lttb_indices(x, ys, n_out):
+    x = np.asarray(x, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    if ys.ndim == 1:
+        ys = ys[:, None]
+
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 0)], dtype=np.int64)
+
+    span = ys.max(axis=0) - ys.min(axis=0)
+    ys = ys / np.where(span > 0, span, 1.0)
+
+    # First and last points are always kept; the rest are split into buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Mean of each bucket, used as the third triangle corner for the previous one
+    csum_x = np.concatenate(([0.0], np.cumsum(x)))
+    csum_y = np.vstack((np.zeros((1, ys.shape[1])), np.cumsum(ys, axis=0)))
+    counts = (ends - starts)[:, None]
+    mean_x = (csum_x[ends] - csum_x[starts]) / counts[:, 0]
+    mean_y = (csum_y[ends] - csum_y[starts]) / counts
+    # The last bucket looks ahead to the final point
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.vstack((mean_y[1:], ys[-1:]))
+
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for b, (lo, hi) in enumerate(zip(starts, ends)):
+        bx, by = x[lo:hi], ys[lo:hi]
+        area = np.abs(
+            (x[a] - next_x[b]) * (by - ys[a])
+            - (x[a] - bx)[:, None] * (next_y[b] - ys[a])
+        ).sum(axis=1)
+        a = lo + int(np.argmax(area))
+        picked[b + 1] = a
+    return picked
+
+# Downsample a list of dict rows on x_key, keeping the given value columns
+def lttb_rows(rows, x_key, y_keys, n_out):
+    if len(rows) <= n_out:
+        return rows
+    x = np.fromiter((r[x_key] for r in rows), dtype=np.float64, count=len(rows))
+    ys = np.array([[r[k] for k in y_keys] for r in rows], dtype=np.float64)
+    return [rows[i] for i in lttb_indices(x, ys, n_out)]
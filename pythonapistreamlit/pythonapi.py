@@ -1,34 +1,147 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime
+import asyncio
+import json
+import os
+import threading
+import numpy as np
+from downsample import lttb_indices
+from ringbuffer import RingBuffer
 
 app = FastAPI()
 
-# In-memory data store
-iot_data = []
+# Readings kept per device (default: 24 hours at one reading every 5 s)
+BUFFER_CAPACITY = int(os.environ.get("IOT_BUFFER_CAPACITY", 17280))
+DEFAULT_DEVICE = "esp32"
+STREAM_QUEUE_SIZE = 100     # readings buffered per slow /stream client
+KEEPALIVE_S = 15            # comment line sent on idle /stream connections
+
+# In-memory data store: device_id -> RingBuffer
+iot_data = {}
+iot_data_lock = threading.Lock()
+
+# One queue per open /stream connection
+subscribers = set()
 
 class SensorData(BaseModel):
     temperature: float
     humidity: float
+    device_id: str = DEFAULT_DEVICE
+
+def get_buffer(device_id):
+    buffer = iot_data.get(device_id)
+    if buffer is None:
+        with iot_data_lock:
+            buffer = iot_data.setdefault(device_id, RingBuffer(BUFFER_CAPACITY))
+    return buffer
+
+def to_entries(seq, ts, temperature, humidity):
+    return [
+        {
+            "id": int(i),
+            "ts": int(t),
+            "time": datetime.fromtimestamp(t / 1000).strftime("%H:%M:%S"),
+            "temperature": float(temp),
+            "humidity": float(hum),
+        }
+        for i, t, temp, hum in zip(seq, ts, temperature, humidity)
+    ]
+
+# Push a new reading to every /stream client; a client that has fallen
+# STREAM_QUEUE_SIZE readings behind skips readings instead of stalling ingest
+def publish(entry):
+    for q in list(subscribers):
+        try:
+            q.put_nowait(entry)
+        except asyncio.QueueFull:
+            pass
 
 @app.post("/update")
-def update_data(data: SensorData):
+async def update_data(data: SensorData):
+    now = datetime.now()
     entry = {
-        "time": datetime.now().strftime("%H:%M:%S"),
+        "ts": int(now.timestamp() * 1000),
+        "time": now.strftime("%H:%M:%S"),
         "temperature": data.temperature,
-        "humidity": data.humidity
+        "humidity": data.humidity,
+        "device_id": data.device_id
     }
-    iot_data.append(entry)
-
-    # Keep last 50 entries
-    if len(iot_data) > 50:
-        iot_data.pop(0)
+    # Oldest reading is overwritten once the buffer is full
+    entry["id"] = get_buffer(data.device_id).append(entry["ts"], data.temperature, data.humidity)
+    publish(entry)
 
     return {"status": "success", "data": entry}
 
+# Readings between from/to (epoch ms), LTTB-downsampled to max_points.
+# With since_id, only readings newer than that id are returned, in full.
 @app.get("/data")
-def get_data():
-    return iot_data
+def get_data(
+    start: int | None = Query(None, alias="from"),
+    end: int | None = Query(None, alias="to"),
+    max_points: int = Query(500, ge=3, le=10000),
+    since_id: int | None = Query(None, ge=0),
+    device_id: str = DEFAULT_DEVICE,
+):
+    buffer = iot_data.get(device_id)
+    if buffer is None:
+        return []
+
+    if since_id is not None:
+        return to_entries(*buffer.since(since_id))
+
+    seq, ts, temperature, humidity = buffer.range(start, end)
+    if len(ts) > max_points:
+        picked = lttb_indices(ts, np.column_stack((temperature, humidity)), max_points)
+        seq, ts, temperature, humidity = seq[picked], ts[picked], temperature[picked], humidity[picked]
+    return to_entries(seq, ts, temperature, humidity)
+
+def to_event(entry):
+    return f"id: {entry['id']}\ndata: {json.dumps(entry)}\n\n"
+
+# Server-Sent Events: one `id:`/`data:` event per new reading.
+# With since_id (or the Last-Event-ID header a reconnecting browser sends),
+# buffered readings newer than that id are replayed first, so nothing
+# ingested between a client's last fetch and its subscription is missed.
+@app.get("/stream")
+async def stream(
+    device_id: str = DEFAULT_DEVICE,
+    since_id: int | None = Query(None, ge=0),
+    last_event_id: str | None = Header(None),
+):
+    if since_id is None and last_event_id and last_event_id.isdigit():
+        since_id = int(last_event_id)
+    # Subscribe before reading the backlog so no reading falls in between
+    q = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+    subscribers.add(q)
+
+    async def events():
+        try:
+            last_sent = None
+            buffer = iot_data.get(device_id)
+            if since_id is not None and buffer is not None:
+                for entry in to_entries(*buffer.since(since_id)):
+                    yield to_event({**entry, "device_id": device_id})
+                    last_sent = entry["id"]
+
+            while True:
+                try:
+                    entry = await asyncio.wait_for(q.get(), timeout=KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                # Skip readings already sent as part of the backlog
+                if entry["device_id"] == device_id and (last_sent is None or entry["id"] > last_sent):
+                    yield to_event(entry)
+        finally:
+            subscribers.discard(q)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,74 @@
+import threading
+import numpy as np
+
+# Fixed-capacity ring buffer of readings, one preallocated NumPy column each
+# for sequence id, timestamp (epoch ms), temperature and humidity.
+# Appending overwrites the oldest reading once full, so both are O(1).
+# Sequence ids start at 1 and only go up, so clients can ask for what's new.
+class RingBuffer:
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.seq = np.zeros(capacity, dtype=np.int64)
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.temperature = np.zeros(capacity, dtype=np.float64)
+        self.humidity = np.zeros(capacity, dtype=np.float64)
+        self.head = 0       # next slot to write
+        self.size = 0
+        self.last_seq = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    # Store one reading and return its sequence id
+    def append(self, ts, temperature, humidity):
+        with self.lock:
+            i = self.head
+            self.last_seq += 1
+            self.seq[i] = self.last_seq
+            self.ts[i] = ts
+            self.temperature[i] = temperature
+            self.humidity[i] = humidity
+            self.head = (i + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+            return self.last_seq
+
+    # Oldest-first (start, stop) index ranges; at most two once wrapped
+    def _spans(self):
+        start = (self.head - self.size) % self.capacity
+        if start + self.size <= self.capacity:
+            return [(start, start + self.size)]
+        return [(start, self.capacity), (0, self.head)]
+
+    # Readings with lo <= key < hi, oldest first, as (seq, ts, temperature, humidity).
+    # The columns are copied while the lock is held: readers run on other
+    # threads than append(), and once the buffer wraps a view could see its
+    # slots overwritten half-way through building a response.
+    def _select(self, key, lo_value, hi_value):
+        with self.lock:
+            parts = []
+            for lo, hi in self._spans():
+                col = key[lo:hi]
+                a = 0 if lo_value is None else int(np.searchsorted(col, lo_value, side="left"))
+                b = len(col) if hi_value is None else int(np.searchsorted(col, hi_value, side="left"))
+                if a < b:
+                    parts.append((lo + a, lo + b))
+
+            columns = (self.seq, self.ts, self.temperature, self.humidity)
+            if len(parts) == 1:
+                lo, hi = parts[0]
+                return tuple(col[lo:hi].copy() for col in columns)
+            return tuple(
+                np.concatenate([col[lo:hi] for lo, hi in parts]) if parts else col[:0]
+                for col in columns
+            )
+
+    # Readings with start <= ts < end
+    def range(self, start=None, end=None):
+        return self._select(self.ts, start, end)
+
+    # Readings with a sequence id greater than since_id
+    def since(self, since_id):
+        return self._select(self.seq, since_id + 1, None)
@@ -0,0 +1,234 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DB_PATH = "iot.db"
+
+# SQLite tuning
+BUSY_TIMEOUT_MS = 5000      # wait this long for a lock instead of failing
+CACHE_SIZE_KB = 16384       # page cache per connection (16 MB)
+
+POOL_SIZE = 8               # most open connections per database file
+
+# Open connections shared by all threads: path -> (idle connections, slots).
+# A connection is checked out by one caller at a time and put back after,
+# so requests on short-lived server threads reuse them too.
+_pools = {}
+_pools_lock = threading.Lock()
+
+def connect(path=DB_PATH):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+def _pool(path):
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = (queue.LifoQueue(), threading.BoundedSemaphore(POOL_SIZE))
+        return _pools[path]
+
+# Check out a pooled connection, opening one if none is idle; waits when
+# POOL_SIZE are already in use. Usage: with connection() as conn: ...
+@contextmanager
+def connection(path=DB_PATH):
+    idle, slots = _pool(path)
+    with slots:
+        try:
+            conn = idle.get_nowait()
+        except queue.Empty:
+            conn = connect(path)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            idle.put(conn)
+
+DEFAULT_DEVICE = "esp32"
+
+# Rollup tables and their bucket width in milliseconds, finest first
+ROLLUPS = [
+    ("data_1m", 60 * 1000),
+    ("data_1h", 60 * 60 * 1000),
+    ("data_1d", 24 * 60 * 60 * 1000),
+]
+MAX_POINTS = 500    # points a chart shows by default
+OVERSAMPLE = 4      # read up to this many rows per point and let LTTB pick among them
+
+def init_db(path=DB_PATH):
+    with connection(path) as conn:
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS data (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    temperature REAL,
+                    humidity REAL,
+                    time TEXT,
+                    ts INTEGER,
+                    device_id TEXT NOT NULL DEFAULT 'esp32'
+                )
+            """)
+        migrate(conn)
+
+def column_names(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+# Upgrade an existing iot.db in place, tracked with PRAGMA user_version
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    if version < 1:
+        # Epoch-millisecond timestamps and a device id, both indexed
+        with conn:
+            columns = column_names(conn, "data")
+            if "ts" not in columns:
+                conn.execute("ALTER TABLE data ADD COLUMN ts INTEGER")
+            if "device_id" not in columns:
+                conn.execute(
+                    f"ALTER TABLE data ADD COLUMN device_id TEXT NOT NULL DEFAULT '{DEFAULT_DEVICE}'"
+                )
+            # Old rows hold local time as text, e.g. '2025-12-14 16:53:03.703306'
+            conn.execute("""
+                UPDATE data
+                SET ts = CAST(ROUND((julianday(time, 'utc') - 2440587.5) * 86400000) AS INTEGER)
+                WHERE ts IS NULL AND time IS NOT NULL
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_data_ts ON data(ts)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_data_device_ts ON data(device_id, ts)")
+            conn.execute("PRAGMA user_version = 1")
+
+    if version < 2:
+        # Rollup tables, filled from the whole raw table on first run
+        with conn:
+            for table, _ in ROLLUPS:
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        device_id TEXT NOT NULL,
+                        bucket INTEGER NOT NULL,
+                        count INTEGER NOT NULL,
+                        temperature_min REAL,
+                        temperature_max REAL,
+                        temperature_sum REAL,
+                        humidity_min REAL,
+                        humidity_max REAL,
+                        humidity_sum REAL,
+                        PRIMARY KEY (device_id, bucket)
+                    ) WITHOUT ROWID
+                """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollup_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    last_id INTEGER NOT NULL
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO rollup_state VALUES (1, 0)")
+            update_rollups(conn)
+            conn.execute("PRAGMA user_version = 2")
+
+# Fold raw rows newer than the rollup watermark into every rollup table.
+# Call inside the same transaction as the insert so the two never drift.
+def update_rollups(conn):
+    last_id = conn.execute("SELECT last_id FROM rollup_state WHERE id = 1").fetchone()[0]
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM data").fetchone()[0]
+    if max_id <= last_id:
+        return
+
+    for table, width in ROLLUPS:
+        conn.execute(f"""
+            INSERT INTO {table}
+            SELECT device_id, ts / {width} * {width}, COUNT(*),
+                   MIN(temperature), MAX(temperature), SUM(temperature),
+                   MIN(humidity), MAX(humidity), SUM(humidity)
+            FROM data
+            WHERE id > ? AND id <= ? AND ts IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (device_id, bucket) DO UPDATE SET
+                count = count + excluded.count,
+                temperature_min = MIN(temperature_min, excluded.temperature_min),
+                temperature_max = MAX(temperature_max, excluded.temperature_max),
+                temperature_sum = temperature_sum + excluded.temperature_sum,
+                humidity_min = MIN(humidity_min, excluded.humidity_min),
+                humidity_max = MAX(humidity_max, excluded.humidity_max),
+                humidity_sum = humidity_sum + excluded.humidity_sum
+        """, (last_id, max_id))
+
+    conn.execute("UPDATE rollup_state SET last_id = ? WHERE id = 1", (max_id,))
+
+# Pick the finest resolution that keeps a window under max_points * OVERSAMPLE
+# rows, e.g. 1440 one-minute buckets for a day at 500 points rather than 24
+# hourly ones. None means raw readings (one every sample_ms).
+def pick_resolution(start_ms, end_ms, max_points=MAX_POINTS, sample_ms=5000):
+    limit = max_points * OVERSAMPLE
+    if (end_ms - start_ms) / sample_ms <= limit:
+        return None
+    for table, width in ROLLUPS:
+        if (end_ms - start_ms) / width <= limit:
+            return table
+    return ROLLUPS[-1][0]
+
+# SQL for a chart window: raw rows for short windows, otherwise
+# min/max/mean/count per bucket from a rollup table.
+# Returns (source table, sql, params) for pd.read_sql or conn.execute.
+def window_query(start_ms, end_ms, device_id=DEFAULT_DEVICE, max_points=MAX_POINTS):
+    table = pick_resolution(start_ms, end_ms, max_points)
+
+    if table is None:
+        sql = """
+            SELECT ts, 1 AS count,
+                   temperature AS temperature_min, temperature AS temperature_max,
+                   temperature AS temperature_mean,
+                   humidity AS humidity_min, humidity AS humidity_max,
+                   humidity AS humidity_mean
+            FROM data
+            WHERE device_id = ? AND ts >= ? AND ts < ?
+            ORDER BY ts
+        """
+    else:
+        sql = f"""
+            SELECT bucket AS ts, count,
+                   temperature_min, temperature_max,
+                   temperature_sum / count AS temperature_mean,
+                   humidity_min, humidity_max,
+                   humidity_sum / count AS humidity_mean
+            FROM {table}
+            WHERE device_id = ? AND bucket >= ? AND bucket < ?
+            ORDER BY bucket
+        """
+    return table or "data", sql, (device_id, start_ms, end_ms)
+
+# Raw readings with id > since_id, oldest first, for incremental refresh
+def query_since(since_id, device_id=DEFAULT_DEVICE, limit=5000, path=DB_PATH, conn=None):
+    return fetch_all("""
+        SELECT id, ts, temperature, humidity
+        FROM data
+        WHERE id > ? AND device_id = ?
+        ORDER BY id
+        LIMIT ?
+    """, (since_id, device_id, limit), path, conn)
+
+# Run a query on `conn`, or on a pooled connection if none is given
+def fetch_all(sql, params=(), path=DB_PATH, conn=None):
+    if conn is not None:
+        return conn.execute(sql, params).fetchall()
+    with connection(path) as conn:
+        return conn.execute(sql, params).fetchall()
+
+# Current time as epoch milliseconds
+def now_ms():
+    return int(time.time() * 1000)
+
+# Raw readings in [start_ms, end_ms), oldest first; uses the ts indexes
+def query_range(start_ms, end_ms, device_id=None, path=DB_PATH, conn=None):
+    sql = "SELECT id, device_id, ts, temperature, humidity FROM data WHERE ts >= ? AND ts < ?"
+    params = [start_ms, end_ms]
+    if device_id is not None:
+        sql += " AND device_id = ?"
+        params.append(device_id)
+    sql += " ORDER BY ts"
+    return fetch_all(sql, params, path, conn)
@@ -0,0 +1,94 @@
+import base64
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import lru_cache
+from PIL import Image, ImageOps, features
+
+# Resized previews of images, built in the background and cached on disk.
+# File names are <content hash>_<width>.<ext>, so a changed image gets a
+# new thumbnail and old ones never need invalidating.
+THUMB_FOLDER = ".thumbnails"
+THUMB_FORMAT = "webp" if features.check("webp") else "jpeg"
+THUMB_QUALITY = 80
+SCALE = 2               # render at 2x the display width for HiDPI screens
+WAIT_S = 0.5            # how long a view waits before falling back to the original
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="thumbnails")
+_pending = {}
+_pending_lock = threading.Lock()
+
+# Content hash of a file, recomputed only when its size or mtime changes
+@lru_cache(maxsize=1024)
+def _hash_file(path, mtime_ns, size):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def content_hash(path):
+    stat = os.stat(path)
+    return _hash_file(path, stat.st_mtime_ns, stat.st_size)
+
+def thumbnail_path(sha256, width):
+    return os.path.join(THUMB_FOLDER, sha256[:2], f"{sha256}_{width}.{THUMB_FORMAT}")
+
+def _build(src_path, dest_path, width):
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.width > width:
+            img.thumbnail((width, width * 10), Image.LANCZOS)
+        if THUMB_FORMAT == "jpeg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        part_path = dest_path + ".part"
+        img.save(part_path, THUMB_FORMAT, quality=THUMB_QUALITY)
+    os.replace(part_path, dest_path)
+    return dest_path
+
+def _done(dest_path, future):
+    with _pending_lock:
+        _pending.pop(dest_path, None)
+
+# Path of a preview of `path` for display at `width` px. The preview is
+# built in the background the first time; if it isn't ready within
+# `wait` seconds the original is returned so the page never blocks on it.
+# `sha256` can be passed when the content hash is already known.
+def get_thumbnail(path, width, sha256=None, wait=WAIT_S):
+    try:
+        sha256 = sha256 or content_hash(path)
+    except OSError:
+        return path
+
+    dest_path = thumbnail_path(sha256, width * SCALE)
+    if os.path.exists(dest_path):
+        return dest_path
+
+    with _pending_lock:
+        future = _pending.get(dest_path)
+        if future is None:
+            future = _pending[dest_path] = _executor.submit(_build, path, dest_path, width * SCALE)
+            future.add_done_callback(lambda f: _done(dest_path, f))
+
+    try:
+        return future.result(timeout=wait)
+    except TimeoutError:
+        return path
+    except (OSError, ValueError):
+        return path  # not an image Pillow can read
+
+# Resized image as a data: URI for CSS backgrounds, encoded once per content
+@lru_cache(maxsize=8)
+def _data_uri(thumb_path):
+    mime = "image/webp" if thumb_path.endswith(".webp") else "image/jpeg"
+    with open(thumb_path, "rb") as f:
+        return f"data:{mime};base64,{base64.b64encode(f.read()).decode()}"
+
+def background_data_uri(path, width=1920):
+    thumb = get_thumbnail(path, width // SCALE, wait=None)
+    if thumb == path:
+        with open(path, "rb") as f:
+            return f"data:image/png;base64,{base64.b64encode(f.read()).decode()}"
+    return _data_uri(thumb)